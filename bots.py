@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+bots.py
+Computer-controlled players driven by a precomputed flow field.
+
+FlowField is built once per level: the player's top-left corner is
+quantised to CELL px cells, a cell is walkable when a player anywhere in
+it does not hit a wall, and a breadth-first search from the cells touching
+FLAG_RECT stores the best of 8 directions for every walkable cell.
+Diagonal moves cost the same as straight ones because the game moves
+both axes at full speed, so BFS distance is exact.  A bot's decision is
+then a single bytearray lookup.
+
+Bot adds tunable skill on top (reaction delay in ticks, chance of a
+wrong move) and turns directions into the same key presses a human would
+use: WASD for blue, arrows for red.
+
+Run this file for a headless benchmark:
+
+    python bots.py --bots 500 --ticks 600 --skill normal
+
+--demo swaps the level for a small synthetic maze (DEMO_WALLS, corridors
+wider than a player, same starts and flag as the game), so the bots can be
+checked even when the shipped level leaves the flag unreachable:
+
+    python bots.py --demo --skill hard
+"""
+import argparse
+import collections
+import random
+import sys
+import time
+
+from maze_grid import MazeGrid
+
+CELL = 4
+
+# 方向编码 -> (dx, dy)；0 = 不动
+DIRS = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+UNREACHABLE = 0xFFFF
+
+# 反应延迟（tick）/ 每次决策走错的概率 / 走错后坚持几个 tick
+SKILLS = {
+    "perfect": {"reaction": 0, "error_rate": 0.0, "error_ticks": 0},
+    "hard": {"reaction": 4, "error_rate": 0.01, "error_ticks": 6},
+    "normal": {"reaction": 10, "error_rate": 0.03, "error_ticks": 10},
+    "easy": {"reaction": 20, "error_rate": 0.08, "error_ticks": 15},
+}
+
+# --demo 用的合成关卡：墙 (x, y, w, h)，800x480。蓝方要绕三道竖墙走 S 形，
+# 红方要先往左绕开旗子下面那道横墙；缺口都 >= 64px，比玩家（48px）宽
+DEMO_WALLS = (
+    (300, 0, 16, 380),
+    (450, 100, 16, 380),
+    (600, 0, 16, 380),
+    (680, 270, 120, 16),
+)
+
+PLAYER_KEYS = {
+    "blue": {"up": "K_w", "down": "K_s", "left": "K_a", "right": "K_d"},
+    "red": {"up": "K_UP", "down": "K_DOWN", "left": "K_LEFT", "right": "K_RIGHT"},
+}
+
+
+class FlowField:
+    """每个可走格子朝旗子的最佳方向；lookup(x, y) 是 O(1) 的"""
+
+    __slots__ = ("cell", "cols", "rows", "dirs", "dist", "size", "goal", "safe", "edge")
+
+    def __init__(self, cell, cols, rows, dirs, dist, size=None, goal=None, safe=None, edge=None):
+        self.cell = cell
+        self.cols = cols
+        self.rows = rows
+        self.dirs = dirs
+        self.dist = dist
+        # 留着建场时的参数和可走格子，关卡局部改了可以只重判那一块（见 updated）
+        self.size = size
+        self.goal = goal
+        self.safe = safe
+        self.edge = edge
+
+    @classmethod
+    def build(cls, blocked, width, height, size, goal_rect, cell=CELL):
+        """blocked(x, y, s) -> s x s 的玩家放在 (x, y) 会不会撞墙；goal_rect 是 (x, y, w, h)
+
+        玩家的位置会被四舍五入到最近的格子，所以主路线只走“整格都安全”的格子
+        （玩家在格子里任何位置都不撞墙）；只有格子原点不撞墙的边角格子
+        最后再补一个指回主路线的方向，免得电脑贴着墙停住。
+        """
+        cols = (width - size) // cell + 1
+        rows = (height - size) // cell + 1
+        safe = MazeGrid(cols, rows)
+        edge = MazeGrid(cols, rows)
+        cls._classify(blocked, safe, edge, size, cell, (0, 0, cols, rows))
+        return cls._solve(safe, edge, size, tuple(goal_rect), cell)
+
+    @staticmethod
+    def _classify(blocked, safe, edge, size, cell, span):
+        """重判 span = (c0, r0, c1, r1) 里的格子：整格安全 / 只有原点不撞墙 / 不能走"""
+        c0, r0, c1, r1 = span
+        half = cell // 2
+        for r in range(r0, r1):
+            for c in range(c0, c1):
+                x, y = c * cell, r * cell
+                is_safe = not blocked(x - half, y - half, size + cell)
+                safe.set_at((c, r), is_safe)
+                edge.set_at((c, r), not is_safe and not blocked(x, y, size))
+
+    @classmethod
+    def _solve(cls, safe, edge, size, goal_rect, cell):
+        cols, rows = safe.get_size()
+        # 玩家矩形碰到旗子的格子都是终点
+        gx, gy, gw, gh = goal_rect
+        dist = [UNREACHABLE] * (cols * rows)
+        dirs = bytearray(cols * rows)
+        queue = collections.deque()
+        for r in range(max(0, (gy - size) // cell), min(rows, (gy + gh) // cell + 1)):
+            for c in range(max(0, (gx - size) // cell), min(cols, (gx + gw) // cell + 1)):
+                x, y = c * cell, r * cell
+                touches = x < gx + gw and x + size > gx and y < gy + gh and y + size > gy
+                if touches and (safe.get_at((c, r)) or edge.get_at((c, r))):
+                    dist[r * cols + c] = 0
+                    queue.append((c, r))
+
+        # 先在安全格子上从终点往外 BFS，再从已到达的格子扩到边角格子
+        cls._flood(queue, safe, dist, dirs, cols, rows)
+        queue.extend(sorted(((i % cols, i // cols) for i, d in enumerate(dist) if d != UNREACHABLE),
+                            key=lambda cr: dist[cr[1] * cols + cr[0]]))
+        cls._flood(queue, edge, dist, dirs, cols, rows)
+        return cls(cell, cols, rows, dirs, dist, size, goal_rect, safe, edge)
+
+    def updated(self, blocked, rects):
+        """碰撞只在像素 rects 里变了：只重判探测框碰到这些 rect 的格子；
+        可走格子一个都没变就原样返回自己，变了才重新 BFS（距离是全局的，没法只算一块）"""
+        cell, size = self.cell, self.size
+        half = cell // 2
+        safe, edge = self.safe.copy(), self.edge.copy()
+        for x, y, w, h in rects:
+            # 安全格子的探测框是 (c*cell - half, r*cell - half)，边长 size + cell
+            span = (max(0, (x - size - half) // cell), max(0, (y - size - half) // cell),
+                    min(self.cols, (x + w + half) // cell + 1), min(self.rows, (y + h + half) // cell + 1))
+            self._classify(blocked, safe, edge, size, cell, span)
+        if safe == self.safe and edge == self.edge:
+            return self
+        return self._solve(safe, edge, size, self.goal, cell)
+
+    @staticmethod
+    def _flood(queue, walkable, dist, dirs, cols, rows):
+        """8 方向 BFS；斜着走要两边直走都通，免得卡墙角"""
+        def passable(c, r):
+            return dist[r * cols + c] != UNREACHABLE or walkable.get_at((c, r))
+
+        while queue:
+            c, r = queue.popleft()
+            d = dist[r * cols + c] + 1
+            for code in range(1, 9):
+                dx, dy = DIRS[code]
+                nc, nr = c - dx, r - dy
+                if not (0 <= nc < cols and 0 <= nr < rows) or dist[nr * cols + nc] != UNREACHABLE:
+                    continue
+                if not walkable.get_at((nc, nr)):
+                    continue
+                if dx and dy and not (passable(c, nr) and passable(nc, r)):
+                    continue
+                dist[nr * cols + nc] = d
+                dirs[nr * cols + nc] = code
+                queue.append((nc, nr))
+
+    @classmethod
+    def for_level(cls, collision_mask, tile_map=None, cell=CELL, previous=None, dirty=None):
+        """按游戏当前的碰撞规则（像素遮罩或格子地图）建场
+
+        给了 previous 和 dirty（碰撞遮罩里变了的像素 rect 列表）就在旧场上增量更新。
+        """
+        import maze_game
+        size = maze_game.PLAYER_SIZE
+        flag = maze_game.FLAG_RECT
+        goal = (flag.x, flag.y, flag.w, flag.h)
+        if tile_map is not None:
+            blocked = tile_map.blocked
+            if dirty is not None:
+                # 格子模式下整格一起变
+                dirty = [tile_map.snap(rect) for rect in dirty]
+        else:
+            blocked = lambda x, y, s: collision_mask.any_in_rect((x, y, s, s))
+        if (previous is not None and dirty is not None and previous.safe is not None
+                and (previous.cell, previous.size, previous.goal) == (cell, size, goal)):
+            return previous.updated(blocked, dirty)
+        return cls.build(blocked, maze_game.WIDTH, maze_game.HEIGHT, size, goal, cell)
+
+    def index(self, x, y):
+        c = min(self.cols - 1, max(0, int(x + self.cell / 2) // self.cell))
+        r = min(self.rows - 1, max(0, int(y + self.cell / 2) // self.cell))
+        return r * self.cols + c
+
+    def lookup(self, x, y):
+        """玩家左上角在 (x, y) 时该往哪走，返回 (dx, dy)，分量是 -1 / 0 / 1"""
+        return DIRS[self.dirs[self.index(x, y)]]
+
+    def distance(self, x, y):
+        """离旗子还有几格；走不到返回 None"""
+        d = self.dist[self.index(x, y)]
+        return None if d == UNREACHABLE else d
+
+    def reachable(self):
+        return sum(1 for d in self.dist if d != UNREACHABLE)
+
+
+class Bot:
+    """一个电脑玩家：每个 tick 调一次 decide(x, y)，得到 (dx, dy)"""
+
+    __slots__ = ("field", "rng", "error_rate", "error_ticks", "pending",
+                 "wrong", "wrong_left", "last_pos", "stuck")
+
+    def __init__(self, field, skill="normal", rng=None):
+        if isinstance(skill, str):
+            skill = SKILLS[skill]
+        self.field = field
+        self.rng = rng or random.Random()
+        self.error_rate = skill["error_rate"]
+        self.error_ticks = skill["error_ticks"]
+        # 反应延迟：这一 tick 的决策要过 reaction 个 tick 才生效
+        self.pending = collections.deque([(0, 0)] * skill["reaction"])
+        self.wrong = (0, 0)
+        self.wrong_left = 0
+        self.last_pos = None
+        self.stuck = 0
+
+    def reset(self):
+        self.pending = collections.deque([(0, 0)] * len(self.pending))
+        self.wrong_left = 0
+        self.last_pos = None
+        self.stuck = 0
+
+    def decide(self, x, y):
+        if self.wrong_left:
+            self.wrong_left -= 1
+            move = self.wrong
+        elif self.error_rate and self.rng.random() < self.error_rate:
+            self.wrong = DIRS[self.rng.randrange(1, 9)]
+            self.wrong_left = self.error_ticks
+            move = self.wrong
+        else:
+            move = self.field.lookup(x, y)
+            # 斜着被墙角卡住（位置没变）就轮流只走一个轴，滑过去
+            if self.last_pos == (x, y) and move[0] and move[1]:
+                self.stuck += 1
+                move = (move[0], 0) if self.stuck & 1 else (0, move[1])
+            else:
+                self.stuck = 0
+        self.last_pos = (x, y)
+
+        if not self.pending:
+            return move
+        self.pending.append(move)
+        return self.pending.popleft()
+
+    def keys(self, x, y, player):
+        """跟 decide 一样，但返回这一 tick 该按下的 pygame 键码集合（WASD / 方向键）"""
+        return direction_keys(self.decide(x, y), player)
+
+
+def direction_keys(move, player):
+    import pygame
+    names = PLAYER_KEYS[player]
+    dx, dy = move
+    pressed = set()
+    if dx:
+        pressed.add(getattr(pygame, names["right"] if dx > 0 else names["left"]))
+    if dy:
+        pressed.add(getattr(pygame, names["down"] if dy > 0 else names["up"]))
+    return pressed
+
+
+class KeyOverlay:
+    """pygame.key.get_pressed() 的结果再叠上电脑按下的键，游戏循环照常 keys[K_w] 读"""
+
+    __slots__ = ("keys", "held")
+
+    def __init__(self, keys, held):
+        self.keys = keys
+        self.held = held
+
+    def __getitem__(self, key):
+        return self.keys[key] or key in self.held
+
+
+def demo_level(width, height, walls=DEMO_WALLS):
+    """合成关卡的碰撞遮罩（MazeGrid），跟 hay_wall_mask 一样 1 = 墙"""
+    grid = MazeGrid(width, height)
+    for x, y, w, h in walls:
+        grid.paste(~MazeGrid(w, h), (x, y))
+    return grid
+
+
+def simulate(field, collision_mask, tile_map, n_bots, ticks, skill, seed=0):
+    """n_bots 个电脑从两个起点出发，用游戏的 move_player 跑 ticks 步"""
+    import maze_game
+    rng = random.Random(seed)
+    starts = (maze_game.BLUE_START, maze_game.RED_START)
+    bots = [Bot(field, skill, random.Random(rng.random())) for _ in range(n_bots)]
+    pos = [list(starts[i % 2]) for i in range(n_bots)]
+    arrived = [None] * n_bots
+    speed = maze_game.PLAYER_SPEED
+    flag = maze_game.FLAG_RECT
+
+    t_decide = t_move = 0.0
+    for tick in range(ticks):
+        t0 = time.perf_counter()
+        moves = [bots[i].decide(pos[i][0], pos[i][1]) if arrived[i] is None else (0, 0)
+                 for i in range(n_bots)]
+        t1 = time.perf_counter()
+        for i, (dx, dy) in enumerate(moves):
+            if arrived[i] is not None:
+                continue
+            x, y, rect = maze_game.move_player(pos[i][0], pos[i][1], dx * speed, dy * speed,
+                                               collision_mask, tile_map)
+            pos[i] = [x, y]
+            if rect.colliderect(flag):
+                arrived[i] = tick + 1
+        t2 = time.perf_counter()
+        t_decide += t1 - t0
+        t_move += t2 - t1
+        if all(a is not None for a in arrived):
+            ticks = tick + 1
+            break
+
+    done = sorted(a for a in arrived if a is not None)
+    return {
+        "bots": n_bots,
+        "ticks": ticks,
+        "arrived": len(done),
+        "median_ticks": done[len(done) // 2] if done else None,
+        "decide_us": t_decide / (ticks * n_bots) * 1e6,
+        "move_us": t_move / (ticks * n_bots) * 1e6,
+    }
+
+
+def main():
+    import os
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    import maze_game
+
+    ap = argparse.ArgumentParser(description="Benchmark flow-field bots on the current level.")
+    ap.add_argument("--bots", type=int, default=200)
+    ap.add_argument("--ticks", type=int, default=maze_game.FPS * 20)
+    ap.add_argument("--skill", choices=sorted(SKILLS), default="normal")
+    ap.add_argument("--cell", type=int, default=CELL)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--demo", action="store_true", help="use the synthetic DEMO_WALLS maze instead of the level")
+    args = ap.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    if args.demo:
+        collision_mask = demo_level(maze_game.WIDTH, maze_game.HEIGHT)
+        tile_map = maze_game.build_tile_map(collision_mask) if maze_game.COLLISION_MODE == "tile" else None
+        print(f"[info] synthetic demo level: {len(DEMO_WALLS)} walls")
+    else:
+        level = maze_game.load_level_data()
+        collision_mask, tile_map = level["hay_wall_mask"], level["tile_map"]
+
+    t0 = time.perf_counter()
+    field = FlowField.for_level(collision_mask, tile_map, args.cell)
+    t_build = time.perf_counter() - t0
+    print(f"[ok] flow field {field.cols}x{field.rows} cells of {field.cell}px, "
+          f"{field.reachable()} reachable, built in {t_build * 1000:.0f} ms")
+    for name, start in (("blue", maze_game.BLUE_START), ("red", maze_game.RED_START)):
+        d = field.distance(*start)
+        print(f"[info] {name} start: {'unreachable' if d is None else f'{d} cells from the flag'}")
+
+    r = simulate(field, collision_mask, tile_map, args.bots, args.ticks, args.skill, args.seed)
+    pygame.quit()
+    print(f"[ok] {r['arrived']}/{r['bots']} bots reached the flag in {r['ticks']} ticks "
+          f"(median {r['median_ticks']})")
+    print(f"[ok] per bot per tick: decide {r['decide_us']:.2f} us, move {r['move_us']:.2f} us "
+          f"-> ~{1e6 / (maze_game.FPS * (r['decide_us'] + r['move_us'])):.0f} bots per core at {maze_game.FPS} FPS")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
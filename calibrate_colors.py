@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+calibrate_colors.py
+Fit the wall / flag colour thresholds from a handful of labelled points.
+
+The background is reduced to a colour histogram once (pixel art has few
+unique colours) and then to a quantised HSV cube with a 3D prefix sum, so
+scoring one candidate threshold box costs a few table lookups instead of a
+per-pixel rescan.  Each class is fitted as an HSV box that contains all of
+its samples, excludes every other labelled sample, and whose border sits
+where the histogram is sparse relative to the mass inside it; the box may
+only grow a limited distance past the samples.  The RGB threshold used by
+pygame.mask.from_threshold is taken from the histogram mass around the
+labelled wall colours.
+
+The result is written to the shared profile (see color_profile.py) that
+all detectors load, unless a fitted threshold covers an implausible share
+of the image; then nothing is written (use --force to write anyway).
+
+Example:
+    python calibrate_colors.py --wall 300,20 --wall 20,300 \
+        --floor 200,200 --floor 100,400 --flag 770,200
+"""
+import argparse
+import math
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+import color_profile
+
+# 量化精度：色相 0.01，饱和度 / 亮度 0.05
+H_BINS, S_BINS, V_BINS = 100, 20, 20
+# 边界最多从样本往外放几个 bin：色相 0.12，饱和度 / 亮度 0.3
+HUE_GROW = 12
+SV_GROW = 6
+# RGB 阈值只看离某个墙样本每个通道都不超过这么远的颜色，取其像素量的 2% ~ 98% 分位
+NEAR_RGB = 48
+RGB_QUANTILE = 0.02
+# 覆盖率超出这个范围就认为拟合失败（占整张图的比例）
+WALL_SHARE = (0.05, 0.75)
+FLAG_SHARE = (0.0002, 0.05)
+
+
+def parse_point(text):
+    try:
+        x, y = text.split(",")
+        return int(x), int(y)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected x,y, got {text!r}")
+
+
+class HsvCube:
+    """histogram 量化到 HSV 网格后的 3D 前缀和；box 计数 O(1)"""
+
+    def __init__(self, hsv_hist, hue_shift=0.0):
+        self.hue_shift = hue_shift
+        cells = [[[0] * V_BINS for _ in range(S_BINS)] for _ in range(H_BINS)]
+        for count, (h, s, v) in hsv_hist:
+            hi, si, vi = self.bin_of(h, s, v)
+            cells[hi][si][vi] += count
+        # cum[h][s][v] = cells[0:h][0:s][0:v] 的和
+        cum = [[[0] * (V_BINS + 1) for _ in range(S_BINS + 1)] for _ in range(H_BINS + 1)]
+        for hi in range(H_BINS):
+            for si in range(S_BINS):
+                row = cells[hi][si]
+                for vi in range(V_BINS):
+                    cum[hi + 1][si + 1][vi + 1] = (
+                        row[vi]
+                        + cum[hi][si + 1][vi + 1] + cum[hi + 1][si][vi + 1] + cum[hi + 1][si + 1][vi]
+                        - cum[hi][si][vi + 1] - cum[hi][si + 1][vi] - cum[hi + 1][si][vi]
+                        + cum[hi][si][vi]
+                    )
+        self.cum = cum
+
+    def shift(self, h):
+        return (h + self.hue_shift) % 1.0
+
+    def bin_of(self, h, s, v):
+        return (
+            min(H_BINS - 1, int(self.shift(h) * H_BINS)),
+            min(S_BINS - 1, int(s * S_BINS)),
+            min(V_BINS - 1, int(v * V_BINS)),
+        )
+
+    def count(self, h0, h1, s0, v0):
+        """像素数：色相 bin [h0, h1)，饱和度 bin >= s0，亮度 bin >= v0"""
+        h0, h1 = max(0, h0), min(H_BINS, h1)
+        s0, v0 = max(0, s0), max(0, v0)
+        if h0 >= h1 or s0 >= S_BINS or v0 >= V_BINS:
+            return 0
+        c = self.cum
+        s1, v1 = S_BINS, V_BINS
+        return (
+            c[h1][s1][v1] - c[h0][s1][v1] - c[h1][s0][v1] - c[h1][s1][v0]
+            + c[h0][s0][v1] + c[h0][s1][v0] + c[h1][s0][v0] - c[h0][s0][v0]
+        )
+
+
+def hue_shift_for(hsv_points):
+    """把样本色相的圆周均值转到 0.5，红色这类跨 0 的区间就不会被切开"""
+    x = sum(math.cos(2 * math.pi * h) for h, _, _ in hsv_points)
+    y = sum(math.sin(2 * math.pi * h) for h, _, _ in hsv_points)
+    mean = (math.atan2(y, x) / (2 * math.pi)) % 1.0
+    return (0.5 - mean) % 1.0
+
+
+def fit_box(hsv_hist, positives, negatives):
+    """在 histogram 空间里搜一个 HSV box：包含 positives、排除 negatives，边界相对内部最稀疏"""
+    cube = HsvCube(hsv_hist, hue_shift_for(positives))
+    pos_bins = [cube.bin_of(*p) for p in positives]
+    lo_h = min(b[0] for b in pos_bins)
+    hi_h = max(b[0] for b in pos_bins) + 1
+    lo_s = min(b[1] for b in pos_bins)
+    lo_v = min(b[2] for b in pos_bins)
+    neg_bins = [cube.bin_of(*n) for n in negatives]
+
+    best = None
+    for h0 in range(lo_h, max(-1, lo_h - HUE_GROW - 1), -1):
+        for h1 in range(hi_h, min(H_BINS, hi_h + HUE_GROW) + 1):
+            for s0 in range(lo_s, max(-1, lo_s - SV_GROW - 1), -1):
+                for v0 in range(lo_v, max(-1, lo_v - SV_GROW - 1), -1):
+                    wrong = sum(1 for nh, ns, nv in neg_bins
+                                if h0 <= nh < h1 and ns >= s0 and nv >= v0)
+                    # 边界内外各一格的像素占 box 内像素的比例越小，阈值越稳；
+                    # 按比例算，box 不会为了边界空就缩到只剩样本或者扩到图像边缘
+                    inside = cube.count(h0, h1, s0, v0)
+                    shell = (cube.count(h0 - 1, h1 + 1, s0 - 1, v0 - 1)
+                             - cube.count(h0 + 1, h1 - 1, s0 + 1, v0 + 1))
+                    score = (wrong, shell / max(1, inside))
+                    if best is None or score < best[0]:
+                        best = (score, h0, h1, s0, v0)
+
+    (wrong, _), h0, h1, s0, v0 = best
+    unshift = lambda b: round((b / H_BINS - cube.hue_shift) % 1.0, 4)
+    box = {
+        "h_min": unshift(h0),
+        "h_max": unshift(h1),
+        "s_min": round(s0 / S_BINS, 4),
+        "v_min": round(v0 / V_BINS, 4),
+    }
+    return box, wrong
+
+
+def _weighted_quantile(pairs, q):
+    """pairs = [(值, 权重)]，按权重取分位数"""
+    pairs = sorted(pairs)
+    total = sum(w for _, w in pairs)
+    acc = 0
+    for value, w in pairs:
+        acc += w
+        if acc >= q * total:
+            return value
+    return pairs[-1][0]
+
+
+def rgb_threshold(hist, samples, box, negatives=()):
+    """给 pygame.mask.from_threshold 用的 RGB 中心 + 容差
+
+    只看 HSV box 里、离某个墙样本不远（NEAR_RGB）的颜色，按像素量取分位数，
+    再保证所有样本都在里面；如果有反例样本落进去，就在分得最开的通道上收紧。
+    """
+    def near(rgb):
+        return any(max(abs(a - b) for a, b in zip(rgb, s)) <= NEAR_RGB for s in samples)
+
+    mass = [(count, rgb) for count, rgb in hist
+            if near(rgb) and color_profile.in_hsv_box(color_profile.rgb_to_hsv(rgb), box)]
+    mass += [(1, s) for s in samples]
+    center, tol = [], []
+    for ch in range(3):
+        values = [(rgb[ch], count) for count, rgb in mass]
+        lo = min(_weighted_quantile(values, RGB_QUANTILE), min(s[ch] for s in samples))
+        hi = max(_weighted_quantile(values, 1 - RGB_QUANTILE), max(s[ch] for s in samples))
+        center.append((lo + hi) // 2)
+        # from_threshold 是严格小于
+        tol.append((hi - lo) // 2 + 2)
+
+    for n in negatives:
+        gaps = [abs(n[ch] - center[ch]) for ch in range(3)]
+        if all(g < t for g, t in zip(gaps, tol)):
+            ch = max(range(3), key=lambda i: gaps[i])
+            tol[ch] = gaps[ch]
+    return center + [255], tol + [120]
+
+
+def rgb_share(hist, center, tol):
+    return sum(c for c, rgb in hist if all(abs(rgb[i] - center[i]) < tol[i] for i in range(3)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Calibrate wall/flag colour thresholds.")
+    ap.add_argument("--image", default="maze/assets/background_maze.png")
+    ap.add_argument("--out", default=str(color_profile.PROFILE_PATH))
+    ap.add_argument("--wall", type=parse_point, action="append", default=[],
+                    help="x,y of a hay/wall pixel (repeatable)")
+    ap.add_argument("--floor", type=parse_point, action="append", default=[],
+                    help="x,y of a walkable pixel (repeatable)")
+    ap.add_argument("--flag", type=parse_point, action="append", default=[],
+                    help="x,y of a flag pixel (repeatable)")
+    ap.add_argument("--keep-shadow", action="store_true",
+                    help="keep the RGB shadow fallback rule in the profile")
+    ap.add_argument("--force", action="store_true",
+                    help="write the profile even if a threshold covers an implausible share of the image")
+    args = ap.parse_args()
+
+    p_img = Path(args.image)
+    if not p_img.exists():
+        raise SystemExit(f"Image not found: {p_img}")
+    if not args.wall:
+        raise SystemExit("need at least one --wall sample")
+
+    img = Image.open(p_img).convert("RGB")
+    hist = color_profile.color_histogram(img)
+    hsv_hist = [(count, color_profile.rgb_to_hsv(rgb)) for count, rgb in hist]
+    total = img.size[0] * img.size[1]
+    print(f"[info] {p_img}: {len(hist)} unique colours for {total} pixels")
+
+    sample = lambda pts: [color_profile.rgb_to_hsv(img.getpixel(p)) for p in pts]
+    wall_hsv, floor_hsv, flag_hsv = sample(args.wall), sample(args.floor), sample(args.flag)
+    rgb_of = lambda pts: [img.getpixel(p) for p in pts]
+
+    profile = color_profile.load_profile(args.out)
+
+    box, wrong = fit_box(hsv_hist, wall_hsv, floor_hsv + flag_hsv)
+    profile["wall_hsv"] = box
+    print(f"[ok] wall_hsv  = {box}" + (f"  ({wrong} labelled samples misclassified)" if wrong else ""))
+    hay_rgb, hay_tol = rgb_threshold(hist, rgb_of(args.wall), box, rgb_of(args.floor + args.flag))
+    profile["hay_rgb"], profile["hay_tol"] = hay_rgb, hay_tol
+    print(f"[ok] hay_rgb   = {hay_rgb}, hay_tol = {hay_tol}")
+    if not args.keep_shadow:
+        profile["wall_shadow_rgb"] = None
+
+    if args.flag:
+        box, wrong = fit_box(hsv_hist, flag_hsv, wall_hsv + floor_hsv)
+        profile["flag_hsv"] = box
+        print(f"[ok] flag_hsv  = {box}" + (f"  ({wrong} labelled samples misclassified)" if wrong else ""))
+
+    # 覆盖率统计也直接在 histogram 上算，不再扫像素
+    n_wall = sum(c for c, rgb in hist if color_profile.is_wall_color(rgb, profile))
+    n_hay = rgb_share(hist, profile["hay_rgb"], profile["hay_tol"])
+    n_flag = sum(c for c, rgb in hist if color_profile.is_flag_color(rgb, profile))
+    print(f"[info] wall pixels: {n_wall} ({n_wall / total:.1%}), hay_rgb pixels: {n_hay} ({n_hay / total:.1%}), "
+          f"flag pixels: {n_flag} ({n_flag / total:.2%})")
+
+    problems = []
+    for name, n, (lo, hi) in (("wall_hsv", n_wall, WALL_SHARE), ("hay_rgb", n_hay, WALL_SHARE),
+                              ("flag_hsv", n_flag, FLAG_SHARE)):
+        if not lo <= n / total <= hi:
+            problems.append(f"{name} covers {n / total:.2%} of the image (expected {lo:.2%} - {hi:.0%})")
+    for p in problems:
+        print(f"[warn] {p}")
+    if problems and not args.force:
+        print(f"[error] profile not written; add or move samples, or pass --force to write {args.out} anyway")
+        return 1
+
+    out = color_profile.save_profile(profile, args.out)
+    print(f"[ok] wrote profile to: {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
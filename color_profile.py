@@ -0,0 +1,115 @@
+"""
+color_profile.py
+Shared colour thresholds for wall (hay) and flag detection.
+
+Every detector (maze_game.py, render_and_report.py, maze/extract_*.py)
+loads its thresholds from one JSON profile instead of carrying its own
+magic numbers.  The profile is written by calibrate_colors.py; when it is
+missing the built-in defaults below are used.
+
+The detectors used to disagree with each other, so the defaults pick one
+of the old rule sets per entry rather than reproducing all of them:
+
+- wall_hsv / wall_shadow_rgb: the HSV rule with RGB shadow fallback from
+  maze/extract_simple.py.  maze_game.is_hay_wall used pure RGB rules
+  (r > 150, g > 110, b < 90 or r > 120, g > 90, b < 75),
+  render_and_report.py used h 0.10-0.20, s > 0.35, and
+  maze/extract_maze_from_image.py and maze/extract_binary_maze.py had
+  their own variants; all of them now use this rule.
+- flag_hsv: the red rule from render_and_report.py.
+- hay_rgb / hay_tol: the from_threshold values from maze/maze_game.py.
+- line_rgb / line_tol: the hay_wall.png line colour from maze_game.py.
+"""
+import colorsys
+import copy
+import json
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+PROFILE_PATH = ROOT / "maze" / "color_profile.json"
+
+# h/s/v 都在 [0,1]；h_min > h_max 表示色相跨过 0（红色）
+DEFAULT_PROFILE = {
+    # 草垛主体黄
+    "wall_hsv": {"h_min": 0.08, "h_max": 0.18, "s_min": 0.25, "v_min": 0.25},
+    # 阴影偏棕兜底（设为 null 关闭）
+    "wall_shadow_rgb": {"r_min": 121, "g_min": 91, "b_max": 89},
+    # 红旗
+    "flag_hsv": {"h_min": 0.94, "h_max": 0.06, "s_min": 0.40, "v_min": 0.20},
+    # pygame.mask.from_threshold 用的 RGB 中心 + 容差
+    "hay_rgb": [226, 171, 66, 255],
+    "hay_tol": [60, 60, 60, 120],
+    # hay_wall.png 里的黑线
+    "line_rgb": [0, 0, 0],
+    "line_tol": [30, 30, 30],
+    # 一个格子里草垛像素占比超过它就算墙
+    "cell_coverage": 0.35,
+}
+
+
+def load_profile(path=None):
+    """读 profile；文件不存在或缺字段时用默认值补齐"""
+    profile = copy.deepcopy(DEFAULT_PROFILE)
+    p = Path(path) if path else PROFILE_PATH
+    if p.exists():
+        data = json.loads(p.read_text(encoding="utf-8"))
+        for key, value in data.items():
+            if isinstance(value, dict) and isinstance(profile.get(key), dict):
+                profile[key].update(value)
+            else:
+                profile[key] = value
+    return profile
+
+
+def save_profile(profile, path=None):
+    p = Path(path) if path else PROFILE_PATH
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(json.dumps(profile, indent=2) + "\n", encoding="utf-8")
+    return p
+
+
+def rgb_to_hsv(rgb):
+    r, g, b = rgb[:3]
+    return colorsys.rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0)
+
+
+def in_hsv_box(hsv, box):
+    """hsv 是否落在 box 里（支持跨 0 的色相区间）"""
+    if not box:
+        return False
+    h, s, v = hsv
+    if s < box["s_min"] or v < box["v_min"]:
+        return False
+    if box["h_min"] <= box["h_max"]:
+        return box["h_min"] <= h <= box["h_max"]
+    return h >= box["h_min"] or h <= box["h_max"]
+
+
+def in_shadow_rule(rgb, rule):
+    if not rule:
+        return False
+    r, g, b = rgb[:3]
+    return r >= rule["r_min"] and g >= rule["g_min"] and b <= rule["b_max"]
+
+
+def is_wall_color(rgb, profile):
+    """判断这个像素是不是草垛（主体黄 + 阴影棕）"""
+    if in_hsv_box(rgb_to_hsv(rgb), profile["wall_hsv"]):
+        return True
+    return in_shadow_rule(rgb, profile.get("wall_shadow_rgb"))
+
+
+def is_flag_color(rgb, profile):
+    return in_hsv_box(rgb_to_hsv(rgb), profile["flag_hsv"])
+
+
+def color_histogram(img):
+    """把一张 PIL 图缩成 [(count, (r, g, b)), ...]；像素风图颜色很少"""
+    img = img.convert("RGB")
+    w, h = img.size
+    return img.getcolors(w * h)
+
+
+def wall_colors(hist, profile):
+    """histogram 里所有被判成墙的颜色，之后逐像素只需查 set"""
+    return {rgb for _, rgb in hist if is_wall_color(rgb, profile)}
@@ -0,0 +1,190 @@
+"""
+hot_reload.py
+Live reload of level assets while the game is running.
+
+AssetWatcher polls file mtimes.  When an image changes, the new pixels are
+diffed against the old ones in TILE x TILE blocks and only the dirty tiles
+of the derived masks are recomputed.  Loading, diffing and rebuilding run
+on a background thread; the updated masks are built on copies and handed
+back as one LevelAssets object, which the game swaps in between frames, so
+a frame never waits for a reload or sees a half-updated level.
+"""
+import concurrent.futures
+import os
+import time
+
+import pygame
+
+from maze_grid import MazeGrid
+
+TILE = 32
+POLL_SECONDS = 0.5
+
+
+class AssetWatcher:
+    """按 mtime 轮询文件变化；没有额外依赖"""
+
+    def __init__(self, paths, interval=POLL_SECONDS):
+        self.interval = interval
+        self.mtimes = {p: self._mtime(p) for p in paths}
+        self.next_poll = time.monotonic() + interval
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def poll(self):
+        """返回自上次以来改过的文件"""
+        now = time.monotonic()
+        if now < self.next_poll:
+            return []
+        self.next_poll = now + self.interval
+        changed = []
+        for path, old in self.mtimes.items():
+            new = self._mtime(path)
+            if new is not None and new != old:
+                self.mtimes[path] = new
+                changed.append(path)
+        return changed
+
+
+def surface_bytes(surf):
+    return pygame.image.tobytes(surf, "RGB")
+
+
+def changed_tiles(old, new, size, tile=TILE, bpp=3):
+    """逐行比较，只有变了的行才逐格比较；返回变了的格子 Rect 列表"""
+    w, h = size
+    pitch = w * bpp
+    dirty = set()
+    for y in range(h):
+        a = y * pitch
+        if old[a:a + pitch] == new[a:a + pitch]:
+            continue
+        ty = y // tile
+        for x0 in range(0, w, tile):
+            s = a + x0 * bpp
+            e = a + min(w, x0 + tile) * bpp
+            if old[s:e] != new[s:e]:
+                dirty.add((x0 // tile, ty))
+    bounds = pygame.Rect(0, 0, w, h)
+    return [pygame.Rect(tx * tile, ty * tile, tile, tile).clip(bounds) for tx, ty in sorted(dirty)]
+
+
+def update_wall_mask(wall_mask, surf, rects, build_wall_mask):
+    """墙体 MazeGrid：只重算 rects 覆盖的像素，在副本上改，旧表不动"""
+    new_mask = wall_mask.copy()
+    for rect in rects:
+        new_mask.paste(build_wall_mask(surf, rect), rect.topleft)
+    return new_mask
+
+
+def update_threshold_mask(mask, surf, rects, color, tol):
+    """pygame.mask.from_threshold 得到的 MazeGrid：只重算 rects 覆盖的区域，在副本上改"""
+    new_mask = mask.copy()
+    for rect in rects:
+        sub = pygame.mask.from_threshold(surf.subsurface(rect), color, tol)
+        new_mask.paste(MazeGrid.from_mask(sub), rect.topleft)
+    return new_mask
+
+
+class LevelAssets:
+    """一关的背景 + 派生出来的遮罩；整体替换，不原地修改"""
+
+    def __init__(self, bg, wall_mask, hay_img, hay_mask, bg_bytes=None, hay_bytes=None):
+        self.bg = bg
+        self.wall_mask = wall_mask
+        self.hay_img = hay_img
+        self.hay_mask = hay_mask
+        self.derived = {}           # derive() 在后台线程里算出来的东西（tile 表、寻路场……）
+        self.bg_bytes = bg_bytes if bg_bytes is not None else surface_bytes(bg)
+        self.hay_bytes = hay_bytes if hay_bytes is not None else surface_bytes(hay_img)
+
+
+class LevelReloader:
+    """监视背景图和 hay_wall 图，变了就在后台线程里增量更新；poll() 只取现成的结果
+
+    derive(level, previous, dirty) 可选，也在后台线程里调用，返回的 dict 放进 level.derived。
+    dirty 只含这次变了的图：{"bg": [rect, ...], "hay": [rect, ...]}，尺寸变了就是整张图一个 rect；
+    derive 可以据此跳过没受影响的东西、只更新变了的区域。
+    """
+
+    def __init__(self, level, bg_path, hay_path, build_wall_mask, hay_rgb, hay_tol, derive=None):
+        self.level = level
+        self.bg_path = bg_path
+        self.hay_path = hay_path
+        self.build_wall_mask = build_wall_mask
+        self.hay_rgb = hay_rgb
+        self.hay_tol = hay_tol
+        self.derive = derive
+        self.watcher = AssetWatcher([bg_path, hay_path])
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-reload")
+        self.pending = None
+
+    def poll(self):
+        """每帧调用一次，很便宜：没有做好的新关卡返回 None，否则返回 LevelAssets（旧对象保持不变）"""
+        if self.pending is not None:
+            if not self.pending.done():
+                return None
+            future, self.pending = self.pending, None
+            try:
+                level = future.result()
+            except Exception as e:  # 后台出错不影响游戏，继续用旧关卡
+                print(f"[reload] failed: {e}")
+                return None
+            if level is not None:
+                self.level = level
+            return level
+        changed = self.watcher.poll()
+        if changed:
+            self.pending = self.pool.submit(self._rebuild, changed, self.level)
+        return None
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _rebuild(self, changed, old):
+        """后台线程：读图、比较、重算遮罩"""
+        bg, wall_mask, bg_bytes = old.bg, old.wall_mask, old.bg_bytes
+        hay_img, hay_mask, hay_bytes = old.hay_img, old.hay_mask, old.hay_bytes
+        dirty = {}
+        t0 = time.perf_counter()
+        try:
+            if self.bg_path in changed:
+                bg = pygame.image.load(self.bg_path).convert()
+                bg_bytes = surface_bytes(bg)
+                if bg.get_size() != old.bg.get_size():
+                    wall_mask = self.build_wall_mask(bg)
+                    rects = [bg.get_rect()]
+                else:
+                    rects = changed_tiles(old.bg_bytes, bg_bytes, bg.get_size())
+                    wall_mask = update_wall_mask(wall_mask, bg, rects, self.build_wall_mask)
+                dirty["bg"] = rects
+                print(f"[reload] {self.bg_path}: {len(rects)} tile(s) updated")
+            if self.hay_path in changed:
+                hay_img = pygame.image.load(self.hay_path).convert()
+                hay_bytes = surface_bytes(hay_img)
+                if hay_img.get_size() != old.hay_img.get_size():
+                    hay_mask = MazeGrid.from_mask(pygame.mask.from_threshold(hay_img, self.hay_rgb, self.hay_tol))
+                    rects = [hay_img.get_rect()]
+                else:
+                    rects = changed_tiles(old.hay_bytes, hay_bytes, hay_img.get_size())
+                    hay_mask = update_threshold_mask(hay_mask, hay_img, rects, self.hay_rgb, self.hay_tol)
+                dirty["hay"] = rects
+                print(f"[reload] {self.hay_path}: {len(rects)} tile(s) updated")
+        except pygame.error as e:
+            # 文件可能还没写完，下次轮询再试
+            print(f"[reload] skipped: {e}")
+            for path in changed:
+                self.watcher.mtimes[path] = None
+            return None
+
+        level = LevelAssets(bg, wall_mask, hay_img, hay_mask, bg_bytes, hay_bytes)
+        if self.derive is not None:
+            level.derived = self.derive(level, old, dirty)
+        print(f"[reload] rebuilt in {(time.perf_counter() - t0) * 1000:.1f} ms (background)")
+        return level
@@ -0,0 +1,168 @@
+"""
+input_latency.py
+Input-to-display latency measurement and the low-latency input path.
+
+pygame events carry no timestamp, so InputLatency.wait() replaces
+clock.tick(): it sleeps in SLICE_SECONDS slices until the frame deadline
+and drains the event queue after every slice, stamping each event with
+the time it was seen.  The game then takes those events from events(),
+calls simulated() after the update and flipped() after
+pygame.display.flip(); for every key event that gives
+
+- event -> simulation: how long the press waited before the game used it,
+- event -> flip: how long until a frame showing its effect was presented,
+
+plus, per frame, how long it took from sampling input to the flip.
+
+Enable reporting with MAZE_LATENCY=1 (summary printed on exit).  With
+low_latency=True the same stamps also drive sub-frame movement:
+key_scale() tells how much of the last frame a key was actually held, so
+a key pressed late in a frame moves the player only for that part, and a
+tap shorter than a frame still counts.  When neither is on, wait() and
+events() are plain clock.tick() / pygame.event.get().
+"""
+import os
+import sys
+import time
+
+import pygame
+
+SLICE_SECONDS = 0.001
+KEY_EVENTS = (pygame.KEYDOWN, pygame.KEYUP)
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return None
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p))] * 1000
+    return pick(0.50), pick(0.90), pick(0.99), values[-1] * 1000
+
+
+class SubFrameKeys:
+    """包一层 get_pressed() 的结果：keys[k] 返回这一帧里按住的比例（0.0 ~ 1.0）"""
+
+    __slots__ = ("keys", "held", "period")
+
+    def __init__(self, keys, held, period):
+        self.keys = keys
+        self.held = held
+        self.period = period
+
+    def __getitem__(self, key):
+        held = self.held.get(key)
+        if held is None:
+            # 没有按键事件的（例如电脑玩家叠上来的键）按整帧算
+            return 1.0 if self.keys[key] else 0.0
+        return min(1.0, held / self.period)
+
+
+class InputLatency:
+    """用 wait() 代替 clock.tick()，用 events() 代替 pygame.event.get()"""
+
+    def __init__(self, fps, enabled=None, low_latency=False):
+        if enabled is None:
+            enabled = os.environ.get("MAZE_LATENCY") == "1"
+        self.enabled = enabled
+        self.low_latency = low_latency
+        self.sliced = enabled or low_latency
+        self.period = 1.0 / fps
+        self.fps = fps
+        self.deadline = None
+        self.pending = []           # (事件, 看到它的时间)
+        self.consumed = []          # 这一帧拿去模拟的按键事件的时间
+        self.t_sample = None
+        self.t_sim = None
+        self.window_start = None
+        self.down_since = {}        # 键 -> 按下时间
+        self.held_acc = {}          # 键 -> 这一帧里已经松开的那几段按住时长
+        self.held = {}
+        self.to_sim = []
+        self.to_flip = []
+        self.sample_to_flip = []
+
+    def _collect(self):
+        now = time.perf_counter()
+        for event in pygame.event.get():
+            self.pending.append((event, now))
+            if event.type == pygame.KEYDOWN:
+                self.down_since.setdefault(event.key, now)
+            elif event.type == pygame.KEYUP and event.key in self.down_since:
+                start = max(self.down_since.pop(event.key), self.window_start or now)
+                self.held_acc[event.key] = self.held_acc.get(event.key, 0.0) + now - start
+
+    def wait(self, clock):
+        """睡到这一帧的截止时间；返回距上一帧的秒数"""
+        if not self.sliced:
+            return clock.tick(self.fps) / 1000.0
+        now = time.perf_counter()
+        if self.deadline is None or now - self.deadline > self.period:
+            # 第一帧或者落后太多：从现在重新对齐
+            self.deadline = now
+        while True:
+            self._collect()
+            left = self.deadline - time.perf_counter()
+            if left <= 0:
+                break
+            time.sleep(min(SLICE_SECONDS, left))
+        self.deadline += self.period
+        return clock.tick() / 1000.0
+
+    def events(self):
+        """这一帧要处理的事件；顺便算出每个键在上一帧里按住了多久"""
+        if not self.sliced:
+            return pygame.event.get()
+        self._collect()
+        now = self.t_sample = time.perf_counter()
+        start = self.window_start if self.window_start is not None else now
+
+        held = self.held_acc
+        for key, since in self.down_since.items():
+            held[key] = held.get(key, 0.0) + now - max(since, start)
+        self.held, self.held_acc = held, {}
+        self.window_start = now
+
+        events = [event for event, _ in self.pending]
+        self.consumed = [t for event, t in self.pending if event.type in KEY_EVENTS]
+        self.pending = []
+        return events
+
+    def key_scale(self, keys):
+        """低延迟模式下把 get_pressed() 换成按住比例；否则原样返回"""
+        if not self.low_latency:
+            return keys
+        return SubFrameKeys(keys, self.held, self.period)
+
+    def simulated(self):
+        if self.enabled:
+            self.t_sim = time.perf_counter()
+
+    def flipped(self):
+        if not self.enabled or self.t_sample is None:
+            return
+        now = time.perf_counter()
+        t_sim = self.t_sim if self.t_sim is not None else now
+        for t in self.consumed:
+            self.to_sim.append(t_sim - t)
+            self.to_flip.append(now - t)
+        self.sample_to_flip.append(now - self.t_sample)
+        self.consumed = []
+        self.t_sim = None
+
+    def report(self, out=None):
+        if not self.enabled:
+            return
+        out = out or sys.stdout
+        self.enabled = False
+        mode = "low-latency" if self.low_latency else "normal"
+        print(f"\n===== input latency ({mode} mode): {len(self.to_flip)} key events, "
+              f"{len(self.sample_to_flip)} frames =====", file=out)
+        for label, values in (("event -> simulation", self.to_sim),
+                              ("event -> flip", self.to_flip),
+                              ("input sample -> flip", self.sample_to_flip)):
+            p = _percentiles(values)
+            if p is None:
+                print(f"{label}: no samples", file=out)
+            else:
+                print(f"{label}: p50 {p[0]:.2f} ms, p90 {p[1]:.2f} ms, p99 {p[2]:.2f} ms, "
+                      f"max {p[3]:.2f} ms", file=out)
@@ -0,0 +1,251 @@
+"""
+match_capture.py
+Non-blocking match recording.
+
+FrameRecorder.capture(surface) is the only call on the game thread: it
+copies the frame's pixel buffer as-is (a plain memory copy of a 32-bit
+surface; other depths go through pygame.image.tobytes) and hands the bytes
+to a bounded queue.  A background thread turns them into Pillow images,
+downscales them and writes the result:
+
+- ``*.gif``   animated GIF (frames are palettised in the worker),
+- ``*.apng``  animated PNG,
+- anything else is a directory of numbered PNGs.
+
+Every format is written frame by frame as frames arrive, so memory stays
+flat however long the match runs.  close() gives the worker at most
+CLOSE_SECONDS to encode the frames still queued (up to queue_frames of
+them); whatever is left after that is discarded and counted, and the file
+is finished anyway (GIF trailer, APNG frame count), so quitting waits at
+most CLOSE_SECONDS plus the one frame being encoded.  Pillow's own
+save_all collects every frame before writing anything, so the animated
+formats go through small streaming writers here instead.
+
+``every`` keeps one frame in N, ``scale`` shrinks frames in the worker,
+and when the queue is full the frame is dropped (and counted) instead of
+making the game wait.  Pillow releases the GIL while resizing and
+encoding, so a thread is enough to keep the 60 FPS loop unaffected.
+"""
+import io
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import pygame
+from PIL import GifImagePlugin, Image
+
+QUEUE_FRAMES = 32
+CLOSE_SECONDS = 1.0
+
+
+def raw_mode(surface):
+    """32 位 surface 的内存布局对应的 Pillow raw 模式（例如 "BGRX"）；别的格式返回 None"""
+    if surface.get_bytesize() != 4:
+        return None
+    layout = ["X"] * 4
+    for channel, mask, shift in zip("RGB", surface.get_masks(), surface.get_shifts()):
+        if mask != 0xFF << shift or shift % 8:
+            return None
+        i = shift // 8
+        layout[i if sys.byteorder == "little" else 3 - i] = channel
+    return "".join(layout)
+
+
+class _GifStream:
+    """逐帧写 GIF：每帧自带调色板（局部颜色表），写完一帧就不再留在内存里"""
+
+    def __init__(self, path, duration):
+        self.fp = open(path, "wb")
+        # GIF 的帧间隔以 10ms 为单位，四舍五入（直接截断的话 17ms 会变成 10ms，放得太快）
+        self.duration = max(10, round(duration / 10) * 10)
+        self.frames = 0
+
+    def add(self, img):
+        frame = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        if not self.frames:
+            header, _ = GifImagePlugin.getheader(frame, info={"loop": 0})
+            self.fp.write(b"".join(header))
+        self.fp.write(b"".join(GifImagePlugin.getdata(frame, duration=self.duration,
+                                                      include_color_table=True)))
+        self.frames += 1
+
+    def close(self):
+        if self.frames:
+            self.fp.write(b";")
+        self.fp.close()
+
+
+class _ApngStream:
+    """逐帧写 APNG：每帧先用 Pillow 编成 PNG，把 IDAT 改包成 fdAT 接到文件后面；
+    acTL 里的总帧数开头不知道，先占位，close() 时回填"""
+
+    SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+    def __init__(self, path, duration):
+        self.fp = open(path, "wb")
+        self.duration = duration
+        self.frames = 0
+        self.seq = 0
+        self.size = None
+        self.actl_at = None
+
+    @staticmethod
+    def _chunks(png):
+        pos = len(_ApngStream.SIGNATURE)
+        while pos < len(png):
+            length, kind = struct.unpack(">I4s", png[pos:pos + 8])
+            yield kind, png[pos + 8:pos + 8 + length]
+            pos += 12 + length
+
+    def _write_chunk(self, kind, data):
+        self.fp.write(struct.pack(">I", len(data)) + kind + data
+                      + struct.pack(">I", zlib.crc32(kind + data)))
+
+    def add(self, img):
+        if self.size is None:
+            self.size = img.size
+        elif img.size != self.size:
+            raise ValueError(f"frame size {img.size} differs from {self.size}")
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", compress_level=1)
+        chunks = list(self._chunks(buf.getvalue()))
+        if not self.frames:
+            self.fp.write(self.SIGNATURE)
+            self._write_chunk(b"IHDR", chunks[0][1])
+            self.actl_at = self.fp.tell()
+            self._write_chunk(b"acTL", struct.pack(">II", 0, 0))
+        w, h = self.size
+        self._write_chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.seq, w, h, 0, 0,
+                                               self.duration, 1000, 0, 0))
+        self.seq += 1
+        for kind, data in chunks:
+            if kind != b"IDAT":
+                continue
+            if not self.frames:
+                self._write_chunk(b"IDAT", data)
+            else:
+                self._write_chunk(b"fdAT", struct.pack(">I", self.seq) + data)
+                self.seq += 1
+        self.frames += 1
+
+    def close(self):
+        if self.frames:
+            self._write_chunk(b"IEND", b"")
+            self.fp.seek(self.actl_at)
+            self._write_chunk(b"acTL", struct.pack(">II", self.frames, 0))
+        self.fp.close()
+
+
+class FrameRecorder:
+    """每帧 flip 之后调用 capture(screen)，结束时调用 close()"""
+
+    def __init__(self, path, fps, every=1, scale=1.0, queue_frames=QUEUE_FRAMES):
+        self.path = Path(path)
+        suffix = self.path.suffix.lower()
+        self.fmt = {".gif": "GIF", ".apng": "APNG"}.get(suffix, "PNGS")
+        self.every = max(1, every)
+        self.scale = scale
+        self.duration = round(1000 * self.every / fps)
+        self.queue = queue.Queue(maxsize=queue_frames)
+        self.stream = None          # 动图模式的逐帧写出器，后台线程里创建和关闭
+        self.seen = 0
+        self.queued = 0
+        self.dropped = 0
+        self.discarded = 0          # close() 超时后没编码就扔掉的帧
+        self.discard = False
+        self.written = 0
+        self.copy_time = 0.0
+        self.error = None
+        if self.fmt == "PNGS":
+            self.path.mkdir(parents=True, exist_ok=True)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.worker = threading.Thread(target=self._run, name="match-capture", daemon=True)
+        self.worker.start()
+
+    def capture(self, surface):
+        """复制这一帧的像素并丢进队列；队列满了就丢帧，不等"""
+        self.seen += 1
+        if (self.seen - 1) % self.every:
+            return
+        t0 = time.perf_counter()
+        mode = raw_mode(surface)
+        if mode is None:
+            item = (surface.get_size(), "RGB", 0, pygame.image.tobytes(surface, "RGB"))
+        else:
+            item = (surface.get_size(), mode, surface.get_pitch(), surface.get_buffer().raw)
+        self.copy_time += time.perf_counter() - t0
+        try:
+            self.queue.put_nowait(item)
+            self.queued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                if self.discard:
+                    self.discarded += 1
+                    continue
+                if self.error is not None:
+                    continue
+                try:
+                    self._encode(*item)
+                except Exception as e:  # 写盘出错就停止录制，游戏照常跑
+                    self.error = e
+        finally:
+            if self.stream is not None:
+                try:
+                    self.stream.close()
+                except Exception as e:
+                    self.error = self.error or e
+
+    def _encode(self, size, mode, pitch, data):
+        img = Image.frombuffer("RGB", size, data, "raw", mode, pitch, 1)
+        if self.scale != 1.0:
+            w, h = size
+            img = img.resize((max(1, round(w * self.scale)), max(1, round(h * self.scale))),
+                             Image.Resampling.BILINEAR)
+        if self.fmt == "PNGS":
+            img.save(self.path / f"frame_{self.written:05d}.png", compress_level=1)
+        else:
+            if self.stream is None:
+                stream_cls = _GifStream if self.fmt == "GIF" else _ApngStream
+                self.stream = stream_cls(self.path, self.duration)
+            self.stream.add(img)
+        self.written += 1
+
+    def close(self, timeout=CLOSE_SECONDS):
+        """发结束标记，最多等 timeout 秒让后台写完积压的帧；超时就扔掉剩下的，只给文件收尾"""
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            self.discard = True
+            # 后台线程开始扔帧，队列很快就有空位
+            self.queue.put(None)
+        self.worker.join(max(0.0, deadline - time.monotonic()))
+        if self.worker.is_alive():
+            self.discard = True
+            self.worker.join()
+        return self.summary()
+
+    def summary(self):
+        return {
+            "path": str(self.path),
+            "format": self.fmt,
+            "frames_seen": self.seen,
+            "frames_queued": self.queued,
+            "frames_dropped": self.dropped,
+            "frames_written": self.written,
+            "frames_discarded": self.discarded,
+            "copy_ms_per_frame": self.copy_time / max(1, self.queued + self.dropped) * 1000,
+            "error": None if self.error is None else str(self.error),
+        }
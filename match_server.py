@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+match_server.py
+Headless match server: many concurrent matches on one asyncio event loop.
+
+Every match ticks at a fixed rate and runs the same movement / flag /
+timer rules as maze_game.py.  All matches on the same level share one
+read-only Level (frozen wall and collision grids, tile map, flag rect),
+which is built once per process.
+
+Protocol: newline-delimited JSON over TCP.
+
+    -> {"op": "join", "match": "m1", "player": "blue"}    (or "red")
+    -> {"op": "input", "dx": 1, "dy": 0}                  (held direction)
+    -> {"op": "stats"}
+    <- {"op": "state", "tick": 12, "blue": [x, y], "red": [x, y], "remaining": 179, "winner": null}
+
+Backpressure: each match has a bounded input queue.  When it is full the
+connection handler waits on it, so the server stops reading that socket
+and TCP pushes back on the client.  State snapshots are skipped for a
+client whose send buffer is over SEND_BUFFER_LIMIT instead of blocking
+the tick.
+
+Usage:
+    python match_server.py serve --port 8765
+    python match_server.py loadtest --matches 200 --seconds 10 --spawn
+"""
+import argparse
+import asyncio
+import collections
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+
+import match_telemetry
+
+TICK_RATE = 60
+INPUT_QUEUE = 32
+SEND_BUFFER_LIMIT = 64 * 1024
+LATENCY_SAMPLES = 200_000
+DEFAULT_PORT = 8765
+
+
+def input_axis(value):
+    """input 消息里的 dx / dy：数字夹到 -1..1；字符串、null、NaN 之类返回 None"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return max(-1, min(1, int(value)))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+class Level:
+    """一关的只读数据；同一关卡的所有对局共用一个实例"""
+
+    __slots__ = ("path", "level_hash", "collision_mask", "tile_map", "flag_rect")
+
+    def __init__(self, path, data, flag_rect, level_hash=None):
+        import tile_collision
+        self.path = path
+        self.level_hash = level_hash
+        self.collision_mask = data["hay_wall_mask"].frozen()
+        tile_map = data["tile_map"]
+        if tile_map is not None:
+            tile_map = tile_collision.TileMap(tile_map.grid.frozen(), tile_map.tile, tile_map.slide)
+        self.tile_map = tile_map
+        self.flag_rect = flag_rect
+
+
+_LEVELS = {}
+
+
+def get_level(bg_path):
+    """每个进程每个关卡只建一次"""
+    level = _LEVELS.get(bg_path)
+    if level is None:
+        import maze_game
+        data = maze_game.load_level_data(bg_path)
+        level = _LEVELS[bg_path] = Level(bg_path, data, maze_game.FLAG_RECT.copy(),
+                                         match_telemetry.level_hash(bg_path, maze_game.HAY_WALL_PATH))
+    return level
+
+
+class TickStats:
+    """tick 延迟（实际开始时间 - 计划时间）和每个 tick 的计算耗时"""
+
+    def __init__(self):
+        self.lateness = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.compute = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.ticks = 0
+        self.dropped_snapshots = 0
+        self.input_waits = 0
+
+    def summary(self):
+        late = sorted(self.lateness)
+        comp = sorted(self.compute)
+        ms = lambda v: round(v * 1000, 3)
+        return {
+            "ticks": self.ticks,
+            "dropped_snapshots": self.dropped_snapshots,
+            "input_waits": self.input_waits,
+            "lateness_ms": {"p50": ms(percentile(late, 0.50)), "p90": ms(percentile(late, 0.90)),
+                            "p99": ms(percentile(late, 0.99)), "max": ms(late[-1] if late else 0)},
+            "compute_ms": {"p50": ms(percentile(comp, 0.50)), "p99": ms(percentile(comp, 0.99)),
+                           "max": ms(comp[-1] if comp else 0)},
+        }
+
+
+class Match:
+    """一局：两个玩家的位置、输入队列、固定频率 tick"""
+
+    def __init__(self, match_id, level, stats, tick_rate=TICK_RATE, telemetry=None):
+        import maze_game
+        self.rules = maze_game
+        self.match_id = match_id
+        self.level = level
+        self.stats = stats
+        self.period = 1.0 / tick_rate
+        self.tick_rate = tick_rate
+        self.inputs = asyncio.Queue(maxsize=INPUT_QUEUE)
+        self.pos = {"blue": list(maze_game.BLUE_START), "red": list(maze_game.RED_START)}
+        self.dirs = {"blue": (0, 0), "red": (0, 0)}
+        self.clients = set()
+        self.tick = 0
+        self.winner = None
+        self.task = None
+        self.telemetry = telemetry
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            now = loop.time()
+            self.stats.lateness.append(max(0.0, now - next_tick))
+            t0 = time.perf_counter()
+            self.step()
+            self.broadcast()
+            self.stats.compute.append(time.perf_counter() - t0)
+            self.stats.ticks += 1
+
+            next_tick += self.period
+            delay = next_tick - loop.time()
+            if delay < -self.period:
+                # 落后太多就别补了，从现在重新对齐
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(max(0.0, delay))
+
+    def step(self):
+        while not self.inputs.empty():
+            player, dx, dy = self.inputs.get_nowait()
+            self.dirs[player] = (dx, dy)
+        if self.winner is not None:
+            return
+
+        rules = self.rules
+        rects = {}
+        for player in ("blue", "red"):
+            dx, dy = self.dirs[player]
+            x, y = self.pos[player]
+            x, y, rects[player] = rules.move_player(
+                x, y, dx * rules.PLAYER_SPEED, dy * rules.PLAYER_SPEED,
+                self.level.collision_mask, self.level.tile_map,
+            )
+            self.pos[player] = [x, y]
+
+        if rects["blue"].colliderect(self.level.flag_rect):
+            self.winner = "A (Blue)"
+        elif rects["red"].colliderect(self.level.flag_rect):
+            self.winner = "B (Red)"
+        self.tick += 1
+        by_flag = self.winner is not None
+        if self.winner is None and self.remaining() == 0:
+            self.winner = rules.closest_to_flag(rects["blue"], rects["red"])
+        if self.winner is not None and self.telemetry is not None:
+            self.telemetry.record(self.telemetry_record(rects, by_flag))
+
+    def telemetry_record(self, rects, by_flag):
+        return match_telemetry.match_record(
+            "server", self.level.level_hash, self.winner,
+            self.tick / self.tick_rate if by_flag else None,
+            self.rules.flag_distances(rects["blue"], rects["red"]),
+            self.rules.BLUE_START, self.rules.RED_START,
+        )
+
+    def remaining(self):
+        return max(0, self.rules.TIMER_SECONDS - self.tick // self.tick_rate)
+
+    def broadcast(self):
+        if not self.clients:
+            return
+        msg = json.dumps({
+            "op": "state", "tick": self.tick,
+            "blue": [round(v, 2) for v in self.pos["blue"]],
+            "red": [round(v, 2) for v in self.pos["red"]],
+            "remaining": self.remaining(), "winner": self.winner,
+        }).encode() + b"\n"
+        for writer in self.clients:
+            if writer.transport.get_write_buffer_size() > SEND_BUFFER_LIMIT:
+                self.stats.dropped_snapshots += 1
+                continue
+            writer.write(msg)
+
+
+class MatchServer:
+    def __init__(self, bg_path, tick_rate=TICK_RATE, telemetry=None):
+        self.level = get_level(bg_path)
+        self.tick_rate = tick_rate
+        self.telemetry = telemetry
+        self.matches = {}
+        self.stats = TickStats()
+
+    def get_match(self, match_id):
+        match = self.matches.get(match_id)
+        if match is None:
+            match = self.matches[match_id] = Match(match_id, self.level, self.stats, self.tick_rate, self.telemetry)
+            match.start()
+        return match
+
+    def leave(self, match, writer):
+        match.clients.discard(writer)
+        if not match.clients:
+            match.stop()
+            self.matches.pop(match.match_id, None)
+
+    def send(self, writer, obj):
+        writer.write(json.dumps(obj).encode() + b"\n")
+
+    async def handle_client(self, reader, writer):
+        match, player = None, None
+        try:
+            async for line in reader:
+                try:
+                    msg = json.loads(line)
+                    op = msg["op"]
+                except (ValueError, KeyError, TypeError):
+                    self.send(writer, {"op": "error", "error": "bad message"})
+                    continue
+
+                if op == "join":
+                    if match is not None:
+                        self.leave(match, writer)
+                    player = msg.get("player")
+                    if player not in ("blue", "red"):
+                        self.send(writer, {"op": "error", "error": "player must be blue or red"})
+                        match = None
+                        continue
+                    match = self.get_match(str(msg.get("match", "default")))
+                    match.clients.add(writer)
+                    self.send(writer, {"op": "joined", "match": match.match_id, "player": player})
+                elif op == "input":
+                    if match is None:
+                        continue
+                    dx, dy = input_axis(msg.get("dx", 0)), input_axis(msg.get("dy", 0))
+                    if dx is None or dy is None:
+                        self.send(writer, {"op": "error", "error": "dx and dy must be numbers"})
+                        continue
+                    item = (player, dx, dy)
+                    if match.inputs.full():
+                        self.stats.input_waits += 1
+                    # 队列满了就在这里等：不再读这个 socket，背压传回客户端
+                    await match.inputs.put(item)
+                elif op == "stats":
+                    summary = self.stats.summary()
+                    summary.update(op="stats", matches=len(self.matches))
+                    self.send(writer, summary)
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if match is not None:
+                self.leave(match, writer)
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f"[ok] serving {self.level.path} on {host}:{port} at {self.tick_rate} ticks/s")
+        async with server:
+            await server.serve_forever()
+
+
+# ---------- 压测客户端 ----------
+
+async def fake_player(host, port, match_id, player, stop_at, input_hz, counters):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(json.dumps({"op": "join", "match": match_id, "player": player}).encode() + b"\n")
+
+    async def read_states():
+        async for _ in reader:
+            counters["states"] += 1
+
+    read_task = asyncio.create_task(read_states())
+    rng = random.Random(f"{match_id}-{player}")
+    loop = asyncio.get_running_loop()
+    try:
+        while loop.time() < stop_at:
+            dx, dy = rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1))
+            writer.write(json.dumps({"op": "input", "dx": dx, "dy": dy}).encode() + b"\n")
+            counters["inputs"] += 1
+            await writer.drain()
+            await asyncio.sleep(1.0 / input_hz)
+    finally:
+        read_task.cancel()
+        writer.close()
+
+
+async def request_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"op": "stats"}\n')
+    await writer.drain()
+    line = await reader.readline()
+    writer.close()
+    return json.loads(line)
+
+
+async def load_test(host, port, matches, seconds, input_hz):
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + seconds
+    counters = collections.Counter()
+    tasks = [
+        fake_player(host, port, f"load-{i}", player, stop_at, input_hz, counters)
+        for i in range(matches) for player in ("blue", "red")
+    ]
+    # 等对局都跑起来再取统计，取完再断开
+    players = asyncio.gather(*tasks)
+    await asyncio.sleep(max(0.0, seconds - 0.5))
+    stats = await request_stats(host, port)
+    await players
+    return stats, counters
+
+
+def wait_for_port(host, port, timeout=30.0):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    import maze_game
+
+    ap = argparse.ArgumentParser(description="Headless multi-match server and load tester.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("serve")
+    sp.add_argument("--host", default="127.0.0.1")
+    sp.add_argument("--port", type=int, default=DEFAULT_PORT)
+    sp.add_argument("--level", default=maze_game.BG_PATH)
+    sp.add_argument("--tick-rate", type=int, default=TICK_RATE)
+    sp.add_argument("--telemetry", default=None, help="SQLite file to record finished matches in")
+    lp = sub.add_parser("loadtest")
+    lp.add_argument("--host", default="127.0.0.1")
+    lp.add_argument("--port", type=int, default=DEFAULT_PORT)
+    lp.add_argument("--matches", type=int, default=100)
+    lp.add_argument("--seconds", type=float, default=10.0)
+    lp.add_argument("--input-hz", type=float, default=10.0)
+    lp.add_argument("--spawn", action="store_true", help="start a server subprocess for the test")
+    args = ap.parse_args()
+
+    if args.cmd == "serve":
+        # 服务器不开窗口；SDL 默认会接管 SIGTERM，关掉好让 terminate() 生效
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+        import pygame
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))
+        telemetry = match_telemetry.TelemetryWriter(args.telemetry) if args.telemetry else None
+        server = MatchServer(args.level, args.tick_rate, telemetry)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if telemetry is not None:
+                telemetry.close()
+        return 0
+
+    proc = None
+    if args.spawn:
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve",
+                                 "--host", args.host, "--port", str(args.port)])
+        if not wait_for_port(args.host, args.port):
+            proc.kill()
+            raise SystemExit("server did not start")
+    try:
+        t0 = time.perf_counter()
+        stats, counters = asyncio.run(load_test(args.host, args.port, args.matches, args.seconds, args.input_hz))
+        elapsed = time.perf_counter() - t0
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    late, comp = stats["lateness_ms"], stats["compute_ms"]
+    print(f"[info] {args.matches} matches, {2 * args.matches} clients, {elapsed:.1f}s")
+    print(f"[ok] server ticks: {stats['ticks']}  live matches: {stats['matches']}")
+    print(f"[ok] tick lateness ms: p50 {late['p50']}  p90 {late['p90']}  p99 {late['p99']}  max {late['max']}")
+    print(f"[ok] tick compute ms:  p50 {comp['p50']}  p99 {comp['p99']}  max {comp['max']}")
+    print(f"[info] inputs sent: {counters['inputs']}, states received: {counters['states']}, "
+          f"dropped snapshots: {stats['dropped_snapshots']}, input queue waits: {stats['input_waits']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+match_telemetry.py
+Local match telemetry in SQLite.
+
+Each finished match becomes one row in ``matches``: winner, how it was
+decided, time to flag, the timeout tiebreak distances, spawn points, the
+level hash and a frame-time summary.  TelemetryWriter.record() only
+appends to an in-memory queue; a background thread writes rows in
+batches (one transaction per BATCH_ROWS rows or FLUSH_SECONDS) and keeps
+the per-level aggregate table ``level_stats`` up to date in the same
+transaction, so per-level statistics are a primary-key read instead of a
+scan.  The leaderboard is served entirely from a partial covering index,
+(level_hash, time_to_flag) plus the columns it returns, so it never
+touches the table.
+
+Query from the command line:
+
+    python match_telemetry.py levels
+    python match_telemetry.py leaderboard --limit 10
+    python match_telemetry.py recent --limit 20
+    python match_telemetry.py bench --rows 1000000 --db /tmp/telemetry_bench.db
+"""
+import argparse
+import hashlib
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+DB_PATH = "maze/telemetry.db"
+BATCH_ROWS = 500
+FLUSH_SECONDS = 2.0
+
+COLUMNS = (
+    "played_at", "source", "level_hash", "winner", "decided_by", "time_to_flag",
+    "blue_dist", "red_dist", "blue_start_x", "blue_start_y", "red_start_x", "red_start_y",
+    "frames", "frame_ms_mean", "frame_ms_p99", "frame_ms_max",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id            INTEGER PRIMARY KEY,
+    played_at     REAL NOT NULL,
+    source        TEXT NOT NULL,
+    level_hash    TEXT NOT NULL,
+    winner        TEXT NOT NULL,
+    decided_by    TEXT NOT NULL,
+    time_to_flag  REAL,
+    blue_dist     INTEGER,
+    red_dist      INTEGER,
+    blue_start_x  REAL,
+    blue_start_y  REAL,
+    red_start_x   REAL,
+    red_start_y   REAL,
+    frames        INTEGER,
+    frame_ms_mean REAL,
+    frame_ms_p99  REAL,
+    frame_ms_max  REAL
+);
+-- 排行榜要的列都在索引里（覆盖索引），查询不用回表；旧版只有前两列的索引直接删掉
+DROP INDEX IF EXISTS matches_leaderboard;
+CREATE INDEX IF NOT EXISTS matches_leaderboard_cover
+    ON matches (level_hash, time_to_flag, winner, source, played_at) WHERE time_to_flag IS NOT NULL;
+CREATE INDEX IF NOT EXISTS matches_level_recent ON matches (level_hash, played_at);
+CREATE INDEX IF NOT EXISTS matches_recent ON matches (played_at);
+CREATE TABLE IF NOT EXISTS level_stats (
+    level_hash    TEXT PRIMARY KEY,
+    matches       INTEGER NOT NULL,
+    blue_wins     INTEGER NOT NULL,
+    red_wins      INTEGER NOT NULL,
+    draws         INTEGER NOT NULL,
+    flag_finishes INTEGER NOT NULL,
+    total_time_to_flag REAL NOT NULL,
+    best_time_to_flag  REAL,
+    last_played   REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+UPSERT_STATS = """
+INSERT INTO level_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (level_hash) DO UPDATE SET
+    matches = matches + excluded.matches,
+    blue_wins = blue_wins + excluded.blue_wins,
+    red_wins = red_wins + excluded.red_wins,
+    draws = draws + excluded.draws,
+    flag_finishes = flag_finishes + excluded.flag_finishes,
+    total_time_to_flag = total_time_to_flag + excluded.total_time_to_flag,
+    best_time_to_flag = CASE
+        WHEN best_time_to_flag IS NULL THEN excluded.best_time_to_flag
+        WHEN excluded.best_time_to_flag IS NULL THEN best_time_to_flag
+        ELSE MIN(best_time_to_flag, excluded.best_time_to_flag) END,
+    last_played = MAX(last_played, excluded.last_played)
+"""
+
+
+def level_hash(*paths):
+    """关卡图片内容的哈希（改了图就是新关卡）；取前 16 位十六进制够用了"""
+    h = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        h.update(Path(path).read_bytes())
+    return h.hexdigest()
+
+
+def frame_summary(frame_times):
+    """每帧耗时（秒）-> (帧数, 平均 ms, p99 ms, 最大 ms)"""
+    if not frame_times:
+        return 0, None, None, None
+    ft = sorted(frame_times)
+    return (len(ft), sum(ft) / len(ft) * 1000,
+            ft[min(len(ft) - 1, int(len(ft) * 0.99))] * 1000, ft[-1] * 1000)
+
+
+def match_record(source, level, winner, time_to_flag, distances, blue_start, red_start, frame_times=()):
+    """把一局的结果整理成一行；distances 是 (蓝离旗, 红离旗)，time_to_flag 超时为 None"""
+    frames, mean, p99, worst = frame_summary(frame_times)
+    return {
+        "played_at": time.time(),
+        "source": source,
+        "level_hash": level,
+        "winner": winner,
+        "decided_by": "timeout" if time_to_flag is None else "flag",
+        "time_to_flag": time_to_flag,
+        "blue_dist": distances[0],
+        "red_dist": distances[1],
+        "blue_start_x": blue_start[0],
+        "blue_start_y": blue_start[1],
+        "red_start_x": red_start[0],
+        "red_start_y": red_start[1],
+        "frames": frames,
+        "frame_ms_mean": mean,
+        "frame_ms_p99": p99,
+        "frame_ms_max": worst,
+    }
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _level_deltas(rows):
+    """一批记录按关卡汇总，用来增量更新 level_stats"""
+    stats = {}
+    for r in rows:
+        s = stats.setdefault(r["level_hash"], [0, 0, 0, 0, 0, 0.0, None, 0.0])
+        s[0] += 1
+        if r["winner"] == "A (Blue)":
+            s[1] += 1
+        elif r["winner"] == "B (Red)":
+            s[2] += 1
+        else:
+            s[3] += 1
+        t = r["time_to_flag"]
+        if t is not None:
+            s[4] += 1
+            s[5] += t
+            s[6] = t if s[6] is None else min(s[6], t)
+        s[7] = max(s[7], r["played_at"])
+    return [(level, *s) for level, s in stats.items()]
+
+
+def write_batch(conn, rows):
+    """一个事务写一批：明细 + 关卡汇总"""
+    with conn:
+        conn.executemany(
+            f"INSERT INTO matches ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [tuple(r[c] for c in COLUMNS) for r in rows],
+        )
+        conn.executemany(UPSERT_STATS, _level_deltas(rows))
+
+
+class TelemetryWriter:
+    """record() 只是入队；后台线程攒够一批或者到时间就写一次"""
+
+    def __init__(self, db_path=DB_PATH, batch_rows=BATCH_ROWS, flush_seconds=FLUSH_SECONDS):
+        self.db_path = str(db_path)
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.queue = queue.SimpleQueue()
+        self.written = 0
+        self.batches = 0
+        self.error = None
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.worker = threading.Thread(target=self._run, name="match-telemetry", daemon=True)
+        self.worker.start()
+
+    def record(self, row):
+        self.queue.put(row)
+
+    def _run(self):
+        # sqlite 连接只在这个线程里用
+        try:
+            conn = connect(self.db_path)
+        except sqlite3.Error as e:
+            self.error = e
+            return
+        batch = []
+        deadline = None
+        done = False
+        while not done:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                row = self.queue.get(timeout=timeout)
+                if row is None:
+                    done = True
+                else:
+                    batch.append(row)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_seconds
+            except queue.Empty:
+                pass
+            if batch and (done or len(batch) >= self.batch_rows or time.monotonic() >= deadline):
+                try:
+                    write_batch(conn, batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                except sqlite3.Error as e:  # 写不进去就丢掉这一批，游戏照常跑
+                    self.error = e
+                batch = []
+                deadline = None
+        conn.close()
+
+    def close(self):
+        """把还在内存里的记录写完再返回"""
+        self.queue.put(None)
+        self.worker.join()
+        return {"written": self.written, "batches": self.batches,
+                "error": None if self.error is None else str(self.error)}
+
+
+# ---------- 查询 ----------
+
+def query_levels(conn, limit):
+    return conn.execute(
+        "SELECT level_hash, matches, blue_wins, red_wins, draws, flag_finishes,"
+        " total_time_to_flag / NULLIF(flag_finishes, 0), best_time_to_flag, last_played"
+        " FROM level_stats ORDER BY matches DESC LIMIT ?", (limit,)
+    ).fetchall()
+
+
+def query_leaderboard(conn, level, limit):
+    return conn.execute(
+        "SELECT time_to_flag, winner, source, played_at FROM matches"
+        " WHERE level_hash = ? AND time_to_flag IS NOT NULL"
+        " ORDER BY time_to_flag LIMIT ?", (level, limit)
+    ).fetchall()
+
+
+def query_recent(conn, level, limit):
+    if level:
+        sql = ("SELECT played_at, level_hash, winner, decided_by, time_to_flag, blue_dist, red_dist, frame_ms_p99"
+               " FROM matches WHERE level_hash = ? ORDER BY played_at DESC LIMIT ?")
+        return conn.execute(sql, (level, limit)).fetchall()
+    sql = ("SELECT played_at, level_hash, winner, decided_by, time_to_flag, blue_dist, red_dist, frame_ms_p99"
+           " FROM matches ORDER BY played_at DESC LIMIT ?")
+    return conn.execute(sql, (limit,)).fetchall()
+
+
+def _fmt_time(t):
+    return "-" if t is None else f"{t:.2f}s"
+
+
+def _fmt_when(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def default_level():
+    """当前游戏用的关卡（背景 + hay_wall 图）的哈希"""
+    import maze_game
+    return level_hash(maze_game.BG_PATH, maze_game.HAY_WALL_PATH)
+
+
+def bench(db_path, rows, levels, seed=0):
+    """灌 rows 行假数据（走 TelemetryWriter），再测几种查询的耗时"""
+    rng = random.Random(seed)
+    level_ids = [f"{rng.getrandbits(64):016x}" for _ in range(levels)]
+    writer = TelemetryWriter(db_path, batch_rows=5000)
+    t0 = time.perf_counter()
+    for _ in range(rows):
+        by_flag = rng.random() < 0.7
+        winner = rng.choice(("A (Blue)", "B (Red)")) if by_flag else rng.choice(("A (Blue)", "B (Red)", "Draw"))
+        row = match_record("bench", rng.choice(level_ids), winner,
+                           rng.uniform(5, 180) if by_flag else None,
+                           (rng.randrange(0, 900), rng.randrange(0, 900)), (200, 200), (700, 300))
+        row["frames"], row["frame_ms_mean"], row["frame_ms_p99"], row["frame_ms_max"] = 3600, 16.7, 18.0, 25.0
+        writer.record(row)
+    t_record = time.perf_counter() - t0
+    result = writer.close()
+    t_total = time.perf_counter() - t0
+
+    conn = connect(db_path)
+    timings = {}
+    for name, fn in (("levels", lambda: query_levels(conn, 20)),
+                     ("leaderboard", lambda: query_leaderboard(conn, level_ids[0], 10)),
+                     ("recent", lambda: query_recent(conn, level_ids[0], 20))):
+        t = time.perf_counter()
+        fn()
+        timings[name] = (time.perf_counter() - t) * 1000
+    total_rows = conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+    conn.close()
+    return {"rows": rows, "total_rows": total_rows, "record_us": t_record / rows * 1e6,
+            "write_s": t_total, "query_ms": timings, **result}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query the local match telemetry database.")
+    ap.add_argument("--db", default=DB_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    lv = sub.add_parser("levels", help="per-level win counts and times")
+    lv.add_argument("--limit", type=int, default=20)
+    lb = sub.add_parser("leaderboard", help="fastest flag captures on one level")
+    lb.add_argument("--level", default=None, help="level hash (default: the current game level)")
+    lb.add_argument("--limit", type=int, default=10)
+    rc = sub.add_parser("recent", help="latest matches")
+    rc.add_argument("--level", default=None)
+    rc.add_argument("--limit", type=int, default=20)
+    bn = sub.add_parser("bench", help="fill a database with synthetic matches and time the queries")
+    bn.add_argument("--rows", type=int, default=1_000_000)
+    bn.add_argument("--levels", type=int, default=50)
+    args = ap.parse_args()
+
+    if args.cmd == "bench":
+        r = bench(args.db, args.rows, args.levels)
+        print(f"[ok] recorded {r['rows']} rows ({r['record_us']:.1f} us per record() call), "
+              f"written in {r['batches']} batches, {r['write_s']:.1f}s total; table has {r['total_rows']} rows")
+        for name, ms in r["query_ms"].items():
+            print(f"[ok] {name} query: {ms:.2f} ms")
+        return 0 if r["error"] is None else 1
+
+    if not Path(args.db).exists():
+        print(f"[error] no telemetry database at {args.db}")
+        return 1
+    conn = connect(args.db)
+
+    if args.cmd == "levels":
+        print(f"{'level':<17} {'matches':>8} {'blue':>7} {'red':>7} {'draw':>6} {'avg flag':>9} {'best':>8}  last played")
+        for level, n, blue, red, draw, _, avg, best, last in query_levels(conn, args.limit):
+            print(f"{level:<17} {n:>8} {blue:>7} {red:>7} {draw:>6} {_fmt_time(avg):>9} {_fmt_time(best):>8}  {_fmt_when(last)}")
+    elif args.cmd == "leaderboard":
+        level = args.level or default_level()
+        print(f"level {level}")
+        for rank, (t, winner, source, when) in enumerate(query_leaderboard(conn, level, args.limit), 1):
+            print(f"{rank:>3}. {_fmt_time(t):>8}  {winner:<9} {source:<7} {_fmt_when(when)}")
+    else:
+        for when, level, winner, by, t, bd, rd, p99 in query_recent(conn, args.level, args.limit):
+            dists = "" if by == "flag" else f"  blue {bd} / red {rd} px from flag"
+            frame = "" if p99 is None else f"  p99 frame {p99:.1f} ms"
+            print(f"{_fmt_when(when)}  {level}  {winner:<9} by {by:<7} {_fmt_time(t):>8}{dists}{frame}")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
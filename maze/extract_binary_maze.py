@@ -1,30 +1,38 @@
+import sys
+from pathlib import Path
 from PIL import Image
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import color_profile
+from maze_grid import MazeGrid
+
+PROFILE = color_profile.load_profile()
+
 def is_hay(pixel):
     r, g, b, a = pixel
     # Transparent = walkable
     if a < 50:
         return False
-    # Adjusted thresholds for yellow haystack detection
-    return (r > 140 and g > 110 and b < 90)
+    return color_profile.is_wall_color((r, g, b), PROFILE)
 
 def main():
     img = Image.open("maze/assets/Golden_haystacks_maze.png").convert("RGBA")
     w, h = img.size
     pixels = img.load()
 
-    maze = []
+    maze = MazeGrid(w, h)
+    # 每种颜色只判断一次
+    seen = {}
     for y in range(h):
-        row = ""
         for x in range(w):
-            if is_hay(pixels[x, y]):
-                row += "X"
-            else:
-                row += " "
-        maze.append(row)
-
-    with open("maze/level_binary_maze.txt", "w", encoding="utf-8") as f:
-        f.write("\n".join(maze))
+            px = pixels[x, y]
+            hit = seen.get(px)
+            if hit is None:
+                hit = seen[px] = is_hay(px)
+            if hit:
+                maze.set_at((x, y))
+
+    maze.save_ascii("maze/level_binary_maze.txt", wall="X")
 
     print("✅ Maze extraction complete!")
     print(f"Saved to: maze/level_binary_maze.txt")
@@ -1,22 +1,20 @@
+import sys
 from PIL import Image
 from pathlib import Path
-import colorsys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import color_profile
+from maze_grid import MazeGrid
 
 IMG = "maze/assets/background_maze.png"
 OUT = "maze/level_maze.txt"
 TILE = 32               # 800x480 -> 25x15
 WIDTH, HEIGHT = 800, 480
 
+PROFILE = color_profile.load_profile()
+
 def is_hay(rgb):
-    r,g,b = rgb
-    h,s,v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
-    # 宽松一点的黄/棕范围：适配高光/阴影
-    if 0.08 <= h <= 0.18 and s >= 0.25 and v >= 0.25:
-        return True
-    # 再补一个"偏棕"兜底（阴影比较暗）
-    if r > 120 and g > 90 and b < 90:
-        return True
-    return False
+    return color_profile.is_wall_color(rgb, PROFILE)
 
 def main():
     p = Path(IMG)
@@ -30,22 +28,21 @@ def main():
     rows = HEIGHT // TILE
     pixels = im.load()
 
-    lines = []
+    grid = MazeGrid(cols, rows)
     for row in range(rows):
         y = row*TILE + TILE//2
         y = min(HEIGHT-1, y)
-        chars = []
         for col in range(cols):
             x = col*TILE + TILE//2
             x = min(WIDTH-1, x)
             rgb = pixels[x,y]
-            chars.append('x' if is_hay(rgb) else ' ')
-        lines.append(''.join(chars))
+            if is_hay(rgb):
+                grid.set_at((col, row))
 
-    Path(OUT).write_text('\n'.join(lines), encoding="utf-8")
+    grid.save_ascii(OUT, wall='x')
     print(f"[ok] wrote {OUT}  ({cols}x{rows})")
     # 预览前5行
-    for ln in lines[:5]:
+    for ln in grid.to_ascii(wall='x').split('\n')[:5]:
         print(ln)
 
 if __name__ == "__main__":
@@ -1,6 +1,10 @@
 import pygame, sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import color_profile
+import mem_profile
+
 # ---------- CONFIG ----------
 ASSETS = Path("maze/assets")
 BG_FILE   = ASSETS / "background_maze.png"    # 你的像素迷宫背景
@@ -19,9 +23,10 @@ SPEED = 3                      # 每帧像素速度
 BLUE_START = (90,  86)        # 蓝：WASD
 RED_START  = (70, 360)        # 红：方向键
 
-# 草垛（黄色）阈值——适配你的贴图
-HAY_RGB   = (226, 171, 66, 255)    # 近似 #E2AB42
-HAY_TOL   = (60,  60,  60, 120)    # 容差，必要时放大/缩小
+# 草垛（黄色）阈值——从 maze/color_profile.json 读，用 calibrate_colors.py 调
+PROFILE   = color_profile.load_profile()
+HAY_RGB   = tuple(PROFILE["hay_rgb"])    # 默认近似 #E2AB42
+HAY_TOL   = tuple(PROFILE["hay_tol"])    # 容差
 
 # ---------- HELPERS ----------
 def load_png(path: Path) -> pygame.Surface:
@@ -73,7 +78,7 @@ def main():
     # Debug wall_mask generation
     print(f"Wall mask pixel count: {wall_mask.count()}")
     if wall_mask.count() < 1000:
-        print("[WARN] wall_mask has very few pixels—adjust HAY_RGB/HAY_TOL.")
+        print("[WARN] wall_mask has very few pixels—re-run calibrate_colors.py.")
 
     # 角色：加载 → 放大一次 → 建 mask
     blue_img_raw = load_png(BLUE_FILE)
@@ -89,6 +94,15 @@ def main():
 
     # 简单 UI 字体（可无视）
     font = pygame.font.SysFont("Arial", 24, bold=True)
+    txt = font.render("Blue: WASD   Red: Arrows   R: restart   ESC: quit",
+                      True, (255,255,255))
+
+    # 墙体调试层只画一次，不要每帧新建整屏 Surface
+    wall_surface = wall_mask.to_surface(setcolor=(255, 255, 255), unsetcolor=(0, 0, 0))
+    wall_surface.set_colorkey((0, 0, 0))
+
+    # MAZE_MEMPROF=1 时统计每帧的内存分配 / GC 停顿
+    memprof = mem_profile.FrameMemoryProfiler()
 
     running = True
     while running:
@@ -124,22 +138,15 @@ def main():
         screen.blit(red_img,  red_rect)
 
         # 底部提示
-        txt = font.render("Blue: WASD   Red: Arrows   R: restart   ESC: quit",
-                          True, (255,255,255))
         screen.blit(txt, (14, WIN_H-30))
 
         # Visualize wall_mask for debugging
-        wall_surface = pygame.Surface((WIN_W, WIN_H))
-        wall_surface.set_colorkey((0, 0, 0))
-        wall_surface.fill((0, 0, 0))
-        for y in range(WIN_H):
-            for x in range(WIN_W):
-                if wall_mask.get_at((x, y)):
-                    wall_surface.set_at((x, y), (255, 255, 255))
         screen.blit(wall_surface, (0, 0))
 
         pygame.display.flip()
+        memprof.frame_done()
 
+    memprof.report()
     pygame.quit()
     sys.exit()
 
@@ -1,8 +1,19 @@
 import pygame
 import sys
+import time
+import concurrent.futures
 from PIL import Image
 from pathlib import Path
-import colorsys
+
+import bots
+import color_profile
+import hot_reload
+import input_latency
+import match_capture
+import match_telemetry
+import mem_profile
+import tile_collision
+from maze_grid import MazeGrid
 
 # ------------ 基础设置 ------------
 WIDTH, HEIGHT = 800, 480
@@ -12,6 +23,10 @@ TIMER_SECONDS = 3 * 60  # 3 分钟
 BG_PATH = "maze/assets/background_maze.png"
 BLUE_PATH = "maze/assets/blue_player.png"
 RED_PATH = "maze/assets/red_player.png"
+HAY_WALL_PATH = "maze/assets/hay_wall.png"
+
+# 运行中改了背景 / hay_wall 图会自动增量重载
+HOT_RELOAD = True
 
 # 你图上的起点
 BLUE_START = (200, 200)  # New position for blue player
@@ -27,54 +42,144 @@ IMG = "maze/assets/background_maze.png"
 OUT = "maze/level_maze.txt"
 TILE = 32               # 800x480 -> 25x15
 
+# 碰撞模式："pixel" 按像素遮罩判断；"tile" 按格子判断（弱机器 / 批量模拟用）
+COLLISION_MODE = "pixel"
+TILE_LEVEL = None       # tile 模式读的 ASCII 关卡（例如 OUT）；None = 从碰撞遮罩（hay_wall）降采样
+TILE_FINE = 8           # 降采样时每格的像素边长
+
+# 低延迟模式：背景先画好再等帧，醒来后尽量晚地采样输入，并按按键事件的时间做帧内移动
+LOW_LATENCY = False
+
+# 录制对局：None 不录；"captures/match.gif" / ".apng" 录动图，其它路径录成一张张 PNG
+RECORD_PATH = None
+RECORD_EVERY = 2        # 每几帧留一帧
+RECORD_SCALE = 0.5      # 缩放比例（在后台线程里缩）
+
+# 每局结果写进本地 SQLite（python match_telemetry.py levels 查看）；None 不记
+TELEMETRY_DB = match_telemetry.DB_PATH
+
+# 电脑控制的玩家，例如 {"red": "normal"}；难度见 bots.SKILLS
+BOT_PLAYERS = {}
+
+# 每帧打印两个玩家的位置和碰撞结果（调试用，默认关：每帧都要格式化字符串、多查一次墙）
+DEBUG_MOVES = False
+
+# 墙 / 旗的颜色阈值，统一从 maze/color_profile.json 读（calibrate_colors.py 生成）
+PROFILE = color_profile.load_profile()
+HAY_RGB = tuple(PROFILE["line_rgb"])  # hay_wall.png 里的黑线 = 碰撞区域
+HAY_TOL = tuple(PROFILE["line_tol"])
+
 
 def is_hay_wall(rgb):
     """判断这个像素是不是黄色草垛"""
-    r, g, b, *_ = rgb  # 忽略多余的通道，例如 Alpha
-    # 主体是金黄
-    if r > 150 and g > 110 and b < 90:
-        return True
-    # 阴影偏棕
-    if r > 120 and g > 90 and b < 75:
-        return True
-    return False
-
-
-def build_wall_mask(bg_surf):
-    """把整张背景图扫一遍，生成一个 True/False 的墙体表"""
-    w, h = bg_surf.get_size()
-    px = pygame.PixelArray(bg_surf)
-    wall_mask = [[False] * w for _ in range(h)]
-    for y in range(h):
-        for x in range(w):
-            color = bg_surf.unmap_rgb(px[x, y])
-            if is_hay_wall(color):
-                wall_mask[y][x] = True
-    del px
-    return wall_mask
+    return color_profile.is_wall_color(rgb, PROFILE)
+
+
+def build_wall_mask(bg_surf, rect=None):
+    """把整张背景图（或其中 rect 一块）扫一遍，生成墙体 MazeGrid"""
+    return MazeGrid.from_surface(bg_surf, is_hay_wall, rect)
+
+
+def build_tile_map(collision_mask):
+    """tile 碰撞模式用的格子地图：有 TILE_LEVEL 就读 ASCII，否则从像素模式的碰撞遮罩（hay_wall）降采样"""
+    if TILE_LEVEL and Path(TILE_LEVEL).exists():
+        return tile_collision.TileMap.from_ascii(TILE_LEVEL, WIDTH)
+    return tile_collision.TileMap.from_pixels(collision_mask, TILE_FINE)
 
 
 def rect_hits_wall(rect, mask):
-    """玩家的矩形跟草垛有没有撞上"""
+    """玩家的矩形跟草垛有没有撞上（mask 是 MazeGrid，按行整块判断）"""
     # Ensure coordinates are within bounds
     if not (0 <= rect.left < mask.get_size()[0] and 0 <= rect.top < mask.get_size()[1]):
         return False
+    return mask.any_in_rect(rect)
 
-    for y in range(max(0, rect.top), min(mask.get_size()[1], rect.bottom)):
-        for x in range(max(0, rect.left), min(mask.get_size()[0], rect.right)):
-            if mask.get_at((x, y)):
-                return True
-    return False
 
+def move_player(x, y, dx, dy, collision_mask, tile_map=None):
+    """按输入移动一个玩家，撞墙就回退；返回新的 (x, y, rect)。游戏和服务器共用"""
+    old_x, old_y = x, y
+    x += dx
+    y += dy
+    if tile_map is not None:
+        # 格子模式：按格子查墙，顺便处理拐角滑动
+        x, y = tile_map.move(old_x, old_y, dx, dy, PLAYER_SIZE)
+
+    rect = pygame.Rect(int(x), int(y), PLAYER_SIZE, PLAYER_SIZE)
+    rect.clamp_ip(pygame.Rect(0, 0, WIDTH, HEIGHT))
+    if tile_map is None and rect_hits_wall(rect, collision_mask):
+        # 撞墙回退
+        x, y = old_x, old_y
+        rect.topleft = (int(x), int(y))
+    return x, y, rect
+
+
+def flag_distances(blue_rect, red_rect):
+    """两个玩家中心到旗子中心的曼哈顿距离"""
+    fx, fy = FLAG_RECT.center
+    bx, by = blue_rect.center
+    rx, ry = red_rect.center
+    return abs(bx - fx) + abs(by - fy), abs(rx - fx) + abs(ry - fy)
+
+
+def closest_to_flag(blue_rect, red_rect):
+    """时间到了没人到旗子，就比谁近"""
+    b_dist, r_dist = flag_distances(blue_rect, red_rect)
+    if b_dist < r_dist:
+        return "A (Blue)"
+    elif r_dist < b_dist:
+        return "B (Red)"
+    return "Draw"
+
+
+def load_level_data(bg_path=BG_PATH, hay_path=HAY_WALL_PATH):
+    """背景图 + 从它派生的墙体 / 碰撞遮罩 / 格子地图；游戏和服务器共用"""
+    bg = pygame.image.load(bg_path).convert()
+
+    # 从背景生成墙体遮罩
+    wall_mask = build_wall_mask(bg)
+
+    # Re-identify black lines in hay_wall.png as collision areas
+    hay_wall_img = pygame.image.load(hay_path).convert()
+    hay_wall_mask = MazeGrid.from_mask(pygame.mask.from_threshold(hay_wall_img, HAY_RGB, HAY_TOL))
+
+    tile_map = build_tile_map(hay_wall_mask) if COLLISION_MODE == "tile" else None
+
+    return {
+        "bg": bg,
+        "wall_mask": wall_mask,
+        "hay_wall_img": hay_wall_img,
+        "hay_wall_mask": hay_wall_mask,
+        "tile_map": tile_map,
+    }
 
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("Pixel Maze Duel")
-    clock = pygame.time.Clock()
 
-    # 背景
-    bg = pygame.image.load(BG_PATH).convert()
+def draw_background(screen, bg, grass_color, covers, font, timer_cache, info, start_ticks):
+    """画跟输入无关的一层：背景、盖板、计时器、底部文字；返回新的 timer_cache"""
+    screen.blit(bg, (0, 0))
+
+    # 盖掉背景里画死的那俩人
+    for cover in covers:
+        pygame.draw.rect(screen, grass_color, cover)
+
+    # 计时器
+    elapsed = (pygame.time.get_ticks() - start_ticks) // 1000
+    remaining = max(0, TIMER_SECONDS - elapsed)
+    m, s = divmod(remaining, 60)
+    pygame.draw.rect(screen, (0, 0, 0), (120, 0, 560, 48))
+    if timer_cache[0] != remaining:
+        timer_cache = (remaining, font.render(f"{m}:{s:02d}", True, (255, 204, 0)))
+    timer_surf = timer_cache[1]
+    screen.blit(timer_surf, (WIDTH // 2 - timer_surf.get_width() // 2, 8))
+
+    # 底部文字
+    screen.blit(info, (10, HEIGHT - 26))
+    return timer_cache
+
+
+def prepare_assets():
+    """启动时的重活都在这里（后台线程里跑）：解码图片、缩放贴图、生成遮罩、找字体"""
+    # 背景和遮罩
+    assets = load_level_data()
 
     # 玩家贴图
     blue_img = pygame.transform.smoothscale(
@@ -84,26 +189,119 @@ def main():
         pygame.image.load(RED_PATH).convert_alpha(), (PLAYER_SIZE, PLAYER_SIZE)
     )
 
-    # 从背景生成墙体遮罩
-    wall_mask = build_wall_mask(bg)
+    # 有电脑玩家就顺便把流场也建好
+    flow_field = None
+    if BOT_PLAYERS:
+        flow_field = bots.FlowField.for_level(assets["hay_wall_mask"], assets["tile_map"])
+
+    assets.update(
+        flow_field=flow_field,
+        blue_img=blue_img,
+        red_img=red_img,
+        font=pygame.font.SysFont("arial", 28, True),
+        small_font=pygame.font.SysFont("arial", 20, True),
+    )
+    return assets
 
-    # Re-identify black lines in hay_wall.png as collision areas
-    hay_wall_img = pygame.image.load("maze/assets/hay_wall.png").convert()
-    HAY_RGB = (0, 0, 0)  # Black color for collision
-    HAY_TOL = (30, 30, 30)  # Tolerance for black detection
-    hay_wall_mask = pygame.mask.from_threshold(hay_wall_img, HAY_RGB, HAY_TOL)
+
+def show_loading(screen, clock, future, t_start):
+    """资源没准备好之前先画一个轻量的等待画面；返回首帧耗时（秒），玩家退出则返回 None"""
+    font = pygame.font.Font(None, 48)
+    small_font = pygame.font.Font(None, 28)
+    title = font.render("Pixel Maze Duel", True, (255, 204, 0))
+    first_frame = None
+    frame = 0
+    while not future.done():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                return None
+
+        screen.fill((20, 30, 20))
+        screen.blit(title, (WIDTH // 2 - title.get_width() // 2, HEIGHT // 2 - 60))
+        dots = "." * (frame // 15 % 4)
+        info = small_font.render(f"Loading{dots}", True, (255, 255, 255))
+        screen.blit(info, (WIDTH // 2 - 50, HEIGHT // 2 + 10))
+        # 两个小方块来回跑，表示没卡住
+        t = frame % 120
+        offset = t if t < 60 else 120 - t
+        pygame.draw.rect(screen, (60, 140, 220), (WIDTH // 2 - 90 + offset * 2, HEIGHT // 2 + 60, 16, 16))
+        pygame.draw.rect(screen, (220, 70, 90), (WIDTH // 2 + 74 - offset * 2, HEIGHT // 2 + 60, 16, 16))
+        pygame.display.flip()
+
+        if first_frame is None:
+            first_frame = time.perf_counter() - t_start
+        frame += 1
+        clock.tick(FPS)
+    if first_frame is None:
+        first_frame = time.perf_counter() - t_start
+    return first_frame
+
+
+def main():
+    t_start = time.perf_counter()
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Pixel Maze Duel")
+    clock = pygame.time.Clock()
+
+    # 重活交给后台线程，窗口先画等待画面；数据一好立刻开局
+    loader = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    future = loader.submit(prepare_assets)
+    first_frame = show_loading(screen, clock, future, t_start)
+    loader.shutdown(wait=False, cancel_futures=True)
+    if first_frame is None:
+        pygame.quit()
+        sys.exit()
+    assets = future.result()
+    playable = time.perf_counter() - t_start
+    print(f"[startup] time-to-first-frame: {first_frame * 1000:.0f} ms, "
+          f"time-to-playable: {playable * 1000:.0f} ms")
+
+    bg = assets["bg"]
+    blue_img, red_img = assets["blue_img"], assets["red_img"]
+    wall_mask = assets["wall_mask"]
+    hay_wall_img, hay_wall_mask = assets["hay_wall_img"], assets["hay_wall_mask"]
+    tile_map = assets["tile_map"]
+    bot_players = {
+        player: bots.Bot(assets["flow_field"], skill) for player, skill in BOT_PLAYERS.items()
+    }
+
+    reloader = None
+    if HOT_RELOAD:
+        def derive(level, previous, dirty):
+            # 在热更新的后台线程里跑：跟着关卡变的东西一起算好，没受影响的直接沿用
+            derived = dict(previous.derived)
+            if TELEMETRY_DB:
+                derived["level_id"] = match_telemetry.level_hash(BG_PATH, HAY_WALL_PATH)
+            rects = dirty.get("hay")
+            if rects is None or (tile_map is not None and TILE_LEVEL):
+                # 碰撞只看 hay_wall（或 ASCII 关卡），只改了背景就什么都不用重算
+                return derived
+            if level.hay_mask.get_size() != previous.hay_mask.get_size():
+                rects = None
+            old_tiles = derived["tile_map"]
+            if old_tiles is not None:
+                derived["tile_map"] = (build_tile_map(level.hay_mask) if rects is None
+                                       else old_tiles.updated(level.hay_mask, rects))
+            if bot_players:
+                derived["flow_field"] = bots.FlowField.for_level(
+                    level.hay_mask, derived["tile_map"], previous=derived.get("flow_field"), dirty=rects
+                )
+            return derived
+
+        level = hot_reload.LevelAssets(bg, wall_mask, hay_wall_img, hay_wall_mask)
+        level.derived = {"tile_map": tile_map, "flow_field": assets.get("flow_field")}
+        reloader = hot_reload.LevelReloader(
+            level, BG_PATH, HAY_WALL_PATH, build_wall_mask, HAY_RGB, HAY_TOL, derive
+        )
 
     # Debugging wall_mask generation
-    wall_pixel_count = sum(sum(row) for row in wall_mask)
+    wall_pixel_count = wall_mask.count()
     print(f"[DEBUG] Wall mask pixel count: {wall_pixel_count}")
 
     # Visualize wall_mask for debugging
-    debug_surf = pygame.Surface((WIDTH, HEIGHT))
+    debug_surf = wall_mask.to_surface(setcolor=(255, 0, 0), unsetcolor=(0, 0, 0))
     debug_surf.set_colorkey((0, 0, 0))
-    for y, row in enumerate(wall_mask):
-        for x, is_wall in enumerate(row):
-            if is_wall:
-                debug_surf.set_at((x, y), (255, 0, 0))
     screen.blit(debug_surf, (0, 0))
 
     # ✅ 盖掉背景里"画死的那两个大人"
@@ -119,17 +317,41 @@ def main():
     red_x, red_y = RED_START
 
     start_ticks = pygame.time.get_ticks()
-    font = pygame.font.SysFont("arial", 28, True)
-    small_font = pygame.font.SysFont("arial", 20, True)
+    font = assets["font"]
+    small_font = assets["small_font"]
 
     winner = None
 
+    # 不变的文字只渲染一次；计时器只在秒数变了才重新渲染
+    info = small_font.render("Blue: WASD   Red: Arrows   R: restart   ESC: quit", True, (255, 255, 255))
+    timer_cache = (None, None)
+
+    # MAZE_MEMPROF=1 时统计每帧的内存分配 / GC 停顿
+    memprof = mem_profile.FrameMemoryProfiler()
+    # MAZE_LATENCY=1 时统计按键 -> 模拟 -> flip 的延迟
+    latency = input_latency.InputLatency(FPS, low_latency=LOW_LATENCY)
+    covers = (cover_blue, cover_red)
+    telemetry = None
+    if TELEMETRY_DB:
+        telemetry = match_telemetry.TelemetryWriter(TELEMETRY_DB)
+        level_id = match_telemetry.level_hash(BG_PATH, HAY_WALL_PATH)
+    frame_times = []
+    recorder = None
+    if RECORD_PATH:
+        recorder = match_capture.FrameRecorder(RECORD_PATH, FPS, RECORD_EVERY, RECORD_SCALE)
+
     running = True
     while running:
-        dt = clock.tick(FPS) / 1000.0
+        if LOW_LATENCY:
+            # 跟输入无关的先画，等帧醒来以后只剩模拟、画玩家和 flip
+            timer_cache = draw_background(screen, bg, grass_color, covers, font, timer_cache, info, start_ticks)
+
+        dt = latency.wait(clock)
+        if winner is None:
+            frame_times.append(dt)
 
         # ---------- 处理事件 ----------
-        for event in pygame.event.get():
+        for event in latency.events():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
@@ -140,53 +362,66 @@ def main():
                     red_x, red_y = RED_START
                     start_ticks = pygame.time.get_ticks()
                     winner = None
+                    frame_times = []
+                    for bot in bot_players.values():
+                        bot.reset()
+
+        # ---------- 资源热更新：帧与帧之间整体替换 ----------
+        if reloader is not None:
+            new_level = reloader.poll()
+            if new_level is not None:
+                bg, wall_mask, hay_wall_mask = new_level.bg, new_level.wall_mask, new_level.hay_mask
+                grass_color = bg.get_at((200, 200))
+                tile_map = new_level.derived["tile_map"]
+                if telemetry is not None:
+                    level_id = new_level.derived["level_id"]
+                for bot in bot_players.values():
+                    bot.field = new_level.derived["flow_field"]
 
         keys = pygame.key.get_pressed()
+        if bot_players and winner is None:
+            # 电脑玩家按的键跟真人一样走下面的 WASD / 方向键逻辑
+            held = set()
+            if "blue" in bot_players:
+                held |= bot_players["blue"].keys(blue_x, blue_y, "blue")
+            if "red" in bot_players:
+                held |= bot_players["red"].keys(red_x, red_y, "red")
+            keys = bots.KeyOverlay(keys, held)
+        # 低延迟模式下 keys[k] 是这一帧里按住的比例
+        keys = latency.key_scale(keys)
 
         if winner is None:
             # ---------- 蓝玩家移动 (WASD) ----------
             old_bx, old_by = blue_x, blue_y
-            if keys[pygame.K_w]:
-                blue_y -= PLAYER_SPEED
-            if keys[pygame.K_s]:
-                blue_y += PLAYER_SPEED
-            if keys[pygame.K_a]:
-                blue_x -= PLAYER_SPEED
-            if keys[pygame.K_d]:
-                blue_x += PLAYER_SPEED
-
-            blue_rect = pygame.Rect(int(blue_x), int(blue_y), PLAYER_SIZE, PLAYER_SIZE)
-            blue_rect.clamp_ip(pygame.Rect(0, 0, WIDTH, HEIGHT))
-            if rect_hits_wall(blue_rect, hay_wall_mask):
-                # 撞墙回退
-                blue_x, blue_y = old_bx, old_by
-                blue_rect.topleft = (int(blue_x), int(blue_y))
+            blue_y -= PLAYER_SPEED * keys[pygame.K_w]
+            blue_y += PLAYER_SPEED * keys[pygame.K_s]
+            blue_x -= PLAYER_SPEED * keys[pygame.K_a]
+            blue_x += PLAYER_SPEED * keys[pygame.K_d]
+
+            blue_x, blue_y, blue_rect = move_player(
+                old_bx, old_by, blue_x - old_bx, blue_y - old_by, hay_wall_mask, tile_map
+            )
 
             # Debugging blue player movement
-            print(f"[DEBUG] Blue position: ({blue_x}, {blue_y})")
-            print(f"[DEBUG] Blue collision: {rect_hits_wall(blue_rect, hay_wall_mask)}")
+            if DEBUG_MOVES:
+                print(f"[DEBUG] Blue position: ({blue_x}, {blue_y})")
+                print(f"[DEBUG] Blue collision: {rect_hits_wall(blue_rect, hay_wall_mask)}")
 
             # ---------- 红玩家移动 (方向键) ----------
             old_rx, old_ry = red_x, red_y
-            if keys[pygame.K_UP]:
-                red_y -= PLAYER_SPEED
-            if keys[pygame.K_DOWN]:
-                red_y += PLAYER_SPEED
-            if keys[pygame.K_LEFT]:
-                red_x -= PLAYER_SPEED
-            if keys[pygame.K_RIGHT]:
-                red_x += PLAYER_SPEED
-
-            red_rect = pygame.Rect(int(red_x), int(red_y), PLAYER_SIZE, PLAYER_SIZE)
-            red_rect.clamp_ip(pygame.Rect(0, 0, WIDTH, HEIGHT))
-            if rect_hits_wall(red_rect, hay_wall_mask):
-                # 撞墙回退
-                red_x, red_y = old_rx, old_ry
-                red_rect.topleft = (int(red_x), int(red_y))
+            red_y -= PLAYER_SPEED * keys[pygame.K_UP]
+            red_y += PLAYER_SPEED * keys[pygame.K_DOWN]
+            red_x -= PLAYER_SPEED * keys[pygame.K_LEFT]
+            red_x += PLAYER_SPEED * keys[pygame.K_RIGHT]
+
+            red_x, red_y, red_rect = move_player(
+                old_rx, old_ry, red_x - old_rx, red_y - old_ry, hay_wall_mask, tile_map
+            )
 
             # Debugging red player movement
-            print(f"[DEBUG] Red position: ({red_x}, {red_y})")
-            print(f"[DEBUG] Red collision: {rect_hits_wall(red_rect, hay_wall_mask)}")
+            if DEBUG_MOVES:
+                print(f"[DEBUG] Red position: ({red_x}, {red_y})")
+                print(f"[DEBUG] Red collision: {rect_hits_wall(red_rect, hay_wall_mask)}")
 
             # ---------- 判胜 ----------
             if blue_rect.colliderect(FLAG_RECT):
@@ -199,41 +434,27 @@ def main():
             remaining = max(0, TIMER_SECONDS - elapsed)
             if remaining == 0 and winner is None:
                 # 时间到了没人到旗子，就比谁近
-                fx, fy = FLAG_RECT.center
-                bx, by = blue_rect.center
-                rx, ry = red_rect.center
-                b_dist = abs(bx - fx) + abs(by - fy)
-                r_dist = abs(rx - fx) + abs(ry - fy)
-                if b_dist < r_dist:
-                    winner = "A (Blue)"
-                elif r_dist < b_dist:
-                    winner = "B (Red)"
-                else:
-                    winner = "Draw"
+                winner = closest_to_flag(blue_rect, red_rect)
 
-        # ---------- 绘制 ----------
-        screen.blit(bg, (0, 0))
+            # ---------- 记录这一局 ----------
+            if winner is not None and telemetry is not None:
+                by_flag = blue_rect.colliderect(FLAG_RECT) or red_rect.colliderect(FLAG_RECT)
+                time_to_flag = (pygame.time.get_ticks() - start_ticks) / 1000 if by_flag else None
+                telemetry.record(match_telemetry.match_record(
+                    "game", level_id, winner, time_to_flag, flag_distances(blue_rect, red_rect),
+                    BLUE_START, RED_START, frame_times,
+                ))
 
-        # 盖掉背景里画死的那俩人
-        pygame.draw.rect(screen, grass_color, cover_blue)
-        pygame.draw.rect(screen, grass_color, cover_red)
+        latency.simulated()
 
-        # 计时器
-        elapsed = (pygame.time.get_ticks() - start_ticks) // 1000
-        remaining = max(0, TIMER_SECONDS - elapsed)
-        m, s = divmod(remaining, 60)
-        pygame.draw.rect(screen, (0, 0, 0), (120, 0, 560, 48))
-        timer_surf = font.render(f"{m}:{s:02d}", True, (255, 204, 0))
-        screen.blit(timer_surf, (WIDTH // 2 - timer_surf.get_width() // 2, 8))
+        # ---------- 绘制 ----------
+        if not LOW_LATENCY:
+            timer_cache = draw_background(screen, bg, grass_color, covers, font, timer_cache, info, start_ticks)
 
         # 玩家（只画一次）
         screen.blit(blue_img, (int(blue_x), int(blue_y)))
         screen.blit(red_img, (int(red_x), int(red_y)))
 
-        # 底部文字
-        info = small_font.render("Blue: WASD   Red: Arrows   R: restart   ESC: quit", True, (255, 255, 255))
-        screen.blit(info, (10, HEIGHT - 26))
-
         if winner:
             w_surf = font.render(f"Winner: {winner}", True, (255, 204, 0))
             screen.blit(w_surf, (WIDTH // 2 - w_surf.get_width() // 2, HEIGHT - 60))
@@ -257,7 +478,23 @@ def main():
         # screen.blit(collision_debug_surf, (0, 0))
 
         pygame.display.flip()
-
+        latency.flipped()
+        if recorder is not None:
+            recorder.capture(screen)
+        memprof.frame_done()
+
+    if reloader is not None:
+        reloader.close()
+    memprof.report()
+    latency.report()
+    if telemetry is not None:
+        telemetry.close()
+    if recorder is not None:
+        rec = recorder.close()
+        print(f"[record] {rec['path']}: {rec['frames_written']} frames written, "
+              f"{rec['frames_dropped']} dropped, {rec['frames_discarded']} discarded at exit, "
+              f"{rec['copy_ms_per_frame']:.2f} ms/frame on the game thread"
+              + (f", error: {rec['error']}" if rec["error"] else ""))
     pygame.quit()
     sys.exit()
 
@@ -267,15 +504,7 @@ if __name__ == "__main__":
 
 
 def is_hay(rgb):
-    r,g,b = rgb
-    h,s,v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
-    # 宽松一点的黄/棕范围：适配高光/阴影
-    if 0.08 <= h <= 0.18 and s >= 0.25 and v >= 0.25:
-        return True
-    # 再补一个“偏棕”兜底（阴影比较暗）
-    if r > 120 and g > 90 and b < 90:
-        return True
-    return False
+    return color_profile.is_wall_color(rgb, PROFILE)
 
 def main():
     p = Path(IMG)
@@ -0,0 +1,310 @@
+"""
+maze_grid.py
+One compact boolean grid type for every mask in the project.
+
+MazeGrid stores one bit per cell in a bytearray, row-major, most significant
+bit first, each row padded to a whole byte.  That is exactly the raw layout
+of a PIL mode "1" image, so PIL conversion is a single buffer copy.  Whole
+rows are handled as Python ints, so counting, bitwise ops, crop, paste,
+dilate and rectangle queries run at C speed per row instead of per cell.
+
+An 800x480 grid takes 48 KB, against several MB for the old
+``[[False] * w for _ in range(h)]`` lists.
+
+pygame and PIL are only imported by the conversion helpers that need them.
+"""
+
+# ASCII 关卡里表示墙的字符
+WALL_CHARS = "xX#"
+
+_BITS_TO_BYTES = bytes.maketrans(b"01", b"\x00\xff")
+
+
+class MazeGrid:
+    """width x height 的位图；get_at / set_at / get_size 与 pygame.mask.Mask 一致"""
+
+    __slots__ = ("width", "height", "stride", "pad", "data")
+
+    def __init__(self, width, height, data=None):
+        self.width = width
+        self.height = height
+        self.stride = (width + 7) >> 3
+        self.pad = self.stride * 8 - width
+        if data is None:
+            data = bytearray(self.stride * height)
+        elif len(data) != self.stride * height:
+            raise ValueError(f"expected {self.stride * height} bytes for {width}x{height}, got {len(data)}")
+        elif not isinstance(data, bytearray):
+            data = bytearray(data)
+        self.data = data
+
+    def __repr__(self):
+        return f"<MazeGrid {self.width}x{self.height} set={self.count()}>"
+
+    def __eq__(self, other):
+        if not isinstance(other, MazeGrid):
+            return NotImplemented
+        return self.get_size() == other.get_size() and self.data == other.data
+
+    def get_size(self):
+        return (self.width, self.height)
+
+    def copy(self):
+        return MazeGrid(self.width, self.height, bytearray(self.data))
+
+    def frozen(self):
+        """只读副本（底层换成 bytes），多个对局共享一份地图时用；写操作会抛 TypeError"""
+        grid = MazeGrid(self.width, self.height)
+        grid.data = bytes(self.data)
+        return grid
+
+    # ---------- 单个格子 ----------
+
+    def get_at(self, pos):
+        x, y = pos
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError(f"{pos} outside {self.width}x{self.height}")
+        return (self.data[y * self.stride + (x >> 3)] >> (7 - (x & 7))) & 1
+
+    def set_at(self, pos, value=1):
+        x, y = pos
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError(f"{pos} outside {self.width}x{self.height}")
+        i = y * self.stride + (x >> 3)
+        bit = 0x80 >> (x & 7)
+        if value:
+            self.data[i] |= bit
+        else:
+            self.data[i] &= ~bit & 0xFF
+
+    # ---------- 整行 ----------
+
+    def row(self, y):
+        """第 y 行的原始字节（memoryview，不复制）"""
+        return memoryview(self.data)[y * self.stride:(y + 1) * self.stride]
+
+    def row_int(self, y):
+        return int.from_bytes(self.data[y * self.stride:(y + 1) * self.stride], "big")
+
+    def set_row_int(self, y, value):
+        self.data[y * self.stride:(y + 1) * self.stride] = value.to_bytes(self.stride, "big")
+
+    def span(self, x0, x1):
+        """x0 <= x < x1 这些列对应的行内位掩码"""
+        if x1 <= x0:
+            return 0
+        return ((1 << (x1 - x0)) - 1) << (self.pad + self.width - x1)
+
+    def _row_ones(self):
+        return self.span(0, self.width)
+
+    # ---------- 统计 / 查询 ----------
+
+    def count(self):
+        return int.from_bytes(self.data, "big").bit_count()
+
+    def _clip(self, rect):
+        x, y, w, h = rect
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        return x0, y0, x1, y1
+
+    def any_in_rect(self, rect):
+        """rect 覆盖的格子里有没有 1（超出边界的部分忽略）"""
+        x0, y0, x1, y1 = self._clip(rect)
+        m = self.span(x0, x1)
+        if not m:
+            return False
+        return any(self.row_int(y) & m for y in range(y0, y1))
+
+    def count_in_rect(self, rect):
+        x0, y0, x1, y1 = self._clip(rect)
+        m = self.span(x0, x1)
+        return sum((self.row_int(y) & m).bit_count() for y in range(y0, y1))
+
+    # ---------- 位运算 ----------
+
+    def _check_same(self, other):
+        if self.get_size() != other.get_size():
+            raise ValueError(f"size mismatch: {self.get_size()} vs {other.get_size()}")
+
+    def _binop(self, other, op):
+        self._check_same(other)
+        n = len(self.data)
+        a = int.from_bytes(self.data, "big")
+        b = int.from_bytes(other.data, "big")
+        return MazeGrid(self.width, self.height, bytearray(op(a, b).to_bytes(n, "big")))
+
+    def __and__(self, other):
+        return self._binop(other, int.__and__)
+
+    def __or__(self, other):
+        return self._binop(other, int.__or__)
+
+    def __xor__(self, other):
+        return self._binop(other, int.__xor__)
+
+    def __sub__(self, other):
+        return self._binop(other, lambda a, b: a & ~b)
+
+    def __invert__(self):
+        ones = self._row_ones().to_bytes(self.stride, "big") * self.height
+        return self._binop(MazeGrid(self.width, self.height, ones), int.__xor__)
+
+    # ---------- 区域 ----------
+
+    def crop(self, rect):
+        """复制 rect 这一块（会先裁到边界内）"""
+        x0, y0, x1, y1 = self._clip(rect)
+        w, h = max(0, x1 - x0), max(0, y1 - y0)
+        out = MazeGrid(w, h)
+        if not w:
+            return out
+        shift = self.pad + self.width - x1
+        keep = (1 << w) - 1
+        for y in range(h):
+            out.set_row_int(y, ((self.row_int(y0 + y) >> shift) & keep) << out.pad)
+        return out
+
+    def paste(self, other, pos):
+        """把 other 整块覆盖到 pos（超出边界的部分丢掉）"""
+        ox, oy = pos
+        src = other
+        if ox < 0 or oy < 0 or ox + other.width > self.width or oy + other.height > self.height:
+            src = other.crop((-ox, -oy, self.width, self.height))
+            ox, oy = max(0, ox), max(0, oy)
+        if not src.width:
+            return
+        m = self.span(ox, ox + src.width)
+        shift = self.pad + self.width - (ox + src.width) - src.pad
+        for y in range(src.height):
+            bits = src.row_int(y)
+            bits = bits << shift if shift >= 0 else bits >> -shift
+            self.set_row_int(oy + y, (self.row_int(oy + y) & ~m) | (bits & m))
+
+    def dilate(self, radius=1):
+        """方形膨胀：每个 1 向四周扩 radius 格（例如把墙按玩家半径加粗）"""
+        ones = self._row_ones()
+        rows = []
+        for y in range(self.height):
+            r = acc = self.row_int(y)
+            for i in range(1, radius + 1):
+                acc |= (r << i) | (r >> i)
+            rows.append(acc & ones)
+        out = MazeGrid(self.width, self.height)
+        for y in range(self.height):
+            acc = 0
+            for yy in range(max(0, y - radius), min(self.height, y + radius + 1)):
+                acc |= rows[yy]
+            out.set_row_int(y, acc)
+        return out
+
+    # ---------- ASCII ----------
+
+    @classmethod
+    def from_ascii(cls, text, wall_chars=WALL_CHARS):
+        lines = text.split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()
+        width = max((len(ln) for ln in lines), default=0)
+        grid = cls(width, len(lines))
+        for y, ln in enumerate(lines):
+            bits = "".join("1" if c in wall_chars else "0" for c in ln.ljust(width))
+            if bits:
+                grid.set_row_int(y, int(bits, 2) << grid.pad)
+        return grid
+
+    def to_ascii(self, wall="X", floor=" "):
+        table = str.maketrans({"0": floor, "1": wall})
+        fmt = f"0{self.width}b"
+        return "\n".join(
+            format(self.row_int(y) >> self.pad, fmt).translate(table) if self.width else ""
+            for y in range(self.height)
+        )
+
+    @classmethod
+    def load_ascii(cls, path, wall_chars=WALL_CHARS):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_ascii(f.read(), wall_chars)
+
+    def save_ascii(self, path, wall="X", floor=" "):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_ascii(wall, floor))
+
+    # ---------- PIL ----------
+
+    @classmethod
+    def from_pil(cls, img):
+        """PIL mode "1" 的原始字节就是这个布局；别的模式按 >= 128 二值化"""
+        from PIL import Image
+        if img.mode != "1":
+            img = img.convert("L").point(lambda v: 255 if v >= 128 else 0).convert("1", dither=Image.Dither.NONE)
+        grid = cls(img.size[0], img.size[1], bytearray(img.tobytes()))
+        if grid.pad:
+            ones = grid._row_ones()
+            for y in range(grid.height):
+                grid.set_row_int(y, grid.row_int(y) & ones)
+        return grid
+
+    def to_pil(self):
+        from PIL import Image
+        return Image.frombytes("1", self.get_size(), bytes(self.data))
+
+    # ---------- pygame ----------
+
+    @classmethod
+    def from_mask(cls, mask):
+        """pygame.mask.Mask -> MazeGrid，一次 to_surface + 逐行 int 解析"""
+        import pygame
+        w, h = mask.get_size()
+        grid = cls(w, h)
+        if not w or not h:
+            return grid
+        surf = mask.to_surface(setcolor=(255, 255, 255, 255), unsetcolor=(0, 0, 0, 255))
+        red = pygame.image.tobytes(surf, "RGBA")[0::4]
+        to_bits = bytes.maketrans(b"\x00\xff", b"01")
+        for y in range(h):
+            grid.set_row_int(y, int(red[y * w:(y + 1) * w].translate(to_bits), 2) << grid.pad)
+        return grid
+
+    def to_mask(self):
+        """MazeGrid -> pygame.mask.Mask（经一张 8 位 surface，colorkey=0）"""
+        import pygame
+        if not self.width or not self.height:
+            return pygame.mask.Mask(self.get_size())
+        fmt = f"0{self.width}b"
+        buf = b"".join(
+            format(self.row_int(y) >> self.pad, fmt).encode().translate(_BITS_TO_BYTES)
+            for y in range(self.height)
+        )
+        surf = pygame.image.frombuffer(buf, self.get_size(), "P")
+        surf.set_colorkey(0)
+        return pygame.mask.from_surface(surf)
+
+    def to_surface(self, setcolor=(255, 255, 255), unsetcolor=(0, 0, 0)):
+        return self.to_mask().to_surface(setcolor=setcolor, unsetcolor=unsetcolor)
+
+    @classmethod
+    def from_surface(cls, surf, is_wall, rect=None):
+        """逐像素用 is_wall(rgb) 判定（每种颜色只判一次），rect 只算一块"""
+        import pygame
+        if rect is not None:
+            surf = surf.subsurface(rect)
+        w, h = surf.get_size()
+        grid = cls(w, h)
+        raw = pygame.image.tobytes(surf, "RGB")
+        seen = {}
+        for y in range(h):
+            bits = bytearray(b"0" * w)
+            base = y * w * 3
+            for x in range(w):
+                i = base + x * 3
+                rgb = raw[i:i + 3]
+                hit = seen.get(rgb)
+                if hit is None:
+                    hit = seen[rgb] = bool(is_wall(tuple(rgb)))
+                if hit:
+                    bits[x] = 0x31
+            if w:
+                grid.set_row_int(y, int(bits, 2) << grid.pad)
+        return grid
@@ -0,0 +1,269 @@
+"""
+mem_profile.py
+Opt-in per-frame memory instrumentation for the game loops.
+
+Enable with the environment variable MAZE_MEMPROF=1 (optionally
+MAZE_MEMPROF_EVERY=N to take a call-site snapshot every N frames instead of
+every frame).  While enabled, FrameMemoryProfiler records:
+
+- bytes allocated per frame by each source line of the game, including
+  temporaries that are freed again within the frame (Rects, f-strings,
+  text surfaces): a line tracer on the game thread closes a span at every
+  line of the repo's own code and charges the tracemalloc peak reached
+  during the span to that line, so calls into pygame or the stdlib are
+  charged to the game line that made them,
+- net bytes / blocks retained per call site across the run (tracemalloc
+  snapshot diffs, so only allocations that outlive their frame),
+- the transient allocation peak inside each frame,
+- every garbage collection with its generation and pause time
+  (gc.callbacks),
+- peak RSS of the process,
+
+and prints a summary on exit.  The line tracer slows the traced frames
+down several times, so frame times under MAZE_MEMPROF=1 are only useful
+relative to each other.  When disabled, frame_done() and report() are
+no-ops, so the game loop pays nothing.
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+TOP_SITES = 15
+TRACE_DEPTH = 1
+# 只给这个目录（含子目录，例如 maze/）下的源码逐行记账；仓库里的虚拟环境 / 第三方包除外
+TRACED_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIRS = ("site-packages", "dist-packages")
+
+
+def _inside(path, directory):
+    try:
+        return os.path.commonpath([path, directory]) == directory
+    except ValueError:  # Windows 上不同盘符
+        return False
+
+
+def _env_dirs():
+    """放在仓库里的虚拟环境（例如 .venv）的根目录"""
+    prefixes = {os.path.abspath(p) for p in (sys.prefix, sys.exec_prefix, sys.base_prefix)}
+    return tuple(p for p in prefixes if p != TRACED_DIR and _inside(p, TRACED_DIR))
+
+
+def peak_rss_bytes():
+    """进程的 RSS 峰值；拿不到（例如 Windows 没有 resource 模块）就返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _fmt_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class FrameMemoryProfiler:
+    """在每帧 flip 之后调用 frame_done()，退出时调用 report()"""
+
+    def __init__(self, enabled=None, every=None):
+        if enabled is None:
+            enabled = os.environ.get("MAZE_MEMPROF") == "1"
+        if every is None:
+            every = int(os.environ.get("MAZE_MEMPROF_EVERY", "1"))
+        self.enabled = enabled
+        self.every = max(1, every)
+        self.frames = 0
+        self.sites = {}             # 调用点 -> [增长的次数, 净字节, 净块数]
+        self.alloc_sites = {}       # (code, 行号) -> [帧数, 字节]，含帧内就释放的临时对象
+        self.frame_peaks = []       # 每帧内的临时分配峰值
+        self.gc_pauses = []         # (代, 秒, 帧号)
+        self._gc_start = None
+        self._last = None
+        self._last_time = None
+        self.frame_times = []
+        if enabled:
+            self._start()
+
+    def _start(self):
+        tracemalloc.start(TRACE_DEPTH)
+        gc.callbacks.append(self._on_gc)
+        self._last = self._snapshot()
+        self._traced = {}           # 文件名 -> 要不要逐行记账
+        self._envs = _env_dirs()
+        self._frame_alloc = {}      # 这一帧：(code, 行号) -> 字节
+        self._where = None
+        self._noise = 0
+        self._mark = 0
+        self._frame_peak = 0
+        self._base_mem = tracemalloc.get_traced_memory()[0]
+        # 记账本身每段会留下几十字节（get_traced_memory 返回的元组），先量出来扣掉
+        noise = []
+        for _ in range(8):
+            self._open_span(None)
+            noise.append(self._close_span())
+        self._noise = min(noise)
+        self._frame_peak = 0
+        # 新调用的函数由 settrace 接管；已经在跑的（例如 main 的游戏循环）要手动挂上
+        sys.settrace(self._trace_call)
+        frame = sys._getframe(1)
+        while frame is not None:
+            if self._is_traced(frame.f_code.co_filename):
+                frame.f_trace = self._trace_line
+            frame = frame.f_back
+        self._open_span(None)
+        self._last_time = time.perf_counter()
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def _is_traced(self, filename):
+        traced = self._traced.get(filename)
+        if traced is None:
+            # "<frozen posixpath>" 之类的不是真文件，abspath 会把它拼到当前目录下
+            path = os.path.abspath(filename)
+            traced = (not filename.startswith("<")
+                      and _inside(path, TRACED_DIR)
+                      and path != os.path.abspath(__file__)
+                      and not any(part in PACKAGE_DIRS for part in path.split(os.sep))
+                      and not any(_inside(path, env) for env in self._envs))
+            self._traced[filename] = traced
+        return traced
+
+    def _open_span(self, where):
+        self._where = where
+        tracemalloc.reset_peak()
+        self._mark = tracemalloc.get_traced_memory()[0]
+
+    def _close_span(self):
+        """把上一段的分配峰值记到 self._where 头上；返回这一段分配的字节"""
+        current, peak = tracemalloc.get_traced_memory()
+        grown = peak - self._mark - self._noise
+        self._frame_peak = max(self._frame_peak, peak - self._base_mem)
+        if grown > 0 and self._where is not None:
+            self._frame_alloc[self._where] = self._frame_alloc.get(self._where, 0) + grown
+        return grown
+
+    def _trace_call(self, frame, event, arg):
+        if not self._is_traced(frame.f_code.co_filename):
+            return None
+        self._close_span()
+        self._open_span((frame.f_code, frame.f_code.co_firstlineno))
+        return self._trace_line
+
+    def _trace_line(self, frame, event, arg):
+        self._close_span()
+        if event == "return":
+            # 回到调用方那一行，剩下的分配记到它头上
+            back = frame.f_back
+            self._open_span(None if back is None else (back.f_code, back.f_lineno))
+        else:
+            self._open_span((frame.f_code, frame.f_lineno))
+        return self._trace_line
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            self.gc_pauses.append((info["generation"], time.perf_counter() - self._gc_start, self.frames))
+            self._gc_start = None
+
+    def frame_done(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.frame_times.append(now - self._last_time)
+        self._last_time = now
+        self.frames += 1
+
+        self._close_span()
+        # 拍快照、过滤会调几万次标准库函数，这段时间先关掉 tracer
+        sys.settrace(None)
+        self.frame_peaks.append(max(0, self._frame_peak))
+        for where, size in self._frame_alloc.items():
+            entry = self.alloc_sites.setdefault(where, [0, 0])
+            entry[0] += 1
+            entry[1] += size
+        self._frame_alloc = {}
+        if self.frames % self.every == 0:
+            snap = self._snapshot()
+            # 正负都累加：一帧涨一帧跌的调用点净增长是 0，不会被重复计入
+            for stat in snap.compare_to(self._last, "lineno"):
+                if not stat.size_diff:
+                    continue
+                frame = stat.traceback[0]
+                key = f"{frame.filename}:{frame.lineno}"
+                entry = self.sites.setdefault(key, [0, 0, 0])
+                entry[0] += stat.size_diff > 0
+                entry[1] += stat.size_diff
+                entry[2] += stat.count_diff
+            self._last = snap
+        # 拍快照本身的分配不算到下一帧头上
+        self._base_mem = tracemalloc.get_traced_memory()[0]
+        self._frame_peak = 0
+        sys.settrace(self._trace_call)
+        self._open_span(None)
+        # 拍快照的时间也不算进帧时间
+        self._last_time = time.perf_counter()
+
+    def report(self, out=None):
+        if not self.enabled:
+            return
+        out = out or sys.stdout
+        sys.settrace(None)
+        gc.callbacks.remove(self._on_gc)
+        tracemalloc.stop()
+        self.enabled = False
+
+        frames = max(1, self.frames)
+        sampled = max(1, self.frames // self.every)
+        print(f"\n===== memory profile: {self.frames} frames =====", file=out)
+        if self.frame_times:
+            ft = sorted(self.frame_times)
+            print(f"frame time: mean {sum(ft) / len(ft) * 1000:.2f} ms, "
+                  f"p99 {ft[min(len(ft) - 1, int(len(ft) * 0.99))] * 1000:.2f} ms, "
+                  f"max {ft[-1] * 1000:.2f} ms", file=out)
+        if self.frame_peaks:
+            print(f"transient allocation peak per frame: mean {_fmt_bytes(sum(self.frame_peaks) / len(self.frame_peaks))}, "
+                  f"max {_fmt_bytes(max(self.frame_peaks))}", file=out)
+
+        print("\nallocated per frame by line (temporaries included, callees charged to the calling line):",
+              file=out)
+        if not self.alloc_sites:
+            print("  none", file=out)
+        ranked = sorted(self.alloc_sites.items(), key=lambda kv: kv[1][1], reverse=True)[:TOP_SITES]
+        for (code, lineno), (hits, size) in ranked:
+            print(f"  {_fmt_bytes(size / frames):>10}/frame  in {hits}/{frames} frames  "
+                  f"{code.co_filename}:{lineno} ({code.co_name})", file=out)
+
+        print(f"\nnet retained growth by call site (snapshot every {self.every} frame(s)):", file=out)
+        grown = [(site, v) for site, v in self.sites.items() if v[1] > 0]
+        if not grown:
+            print("  none", file=out)
+        ranked = sorted(grown, key=lambda kv: kv[1][1], reverse=True)[:TOP_SITES]
+        for site, (hits, size, count) in ranked:
+            print(f"  {_fmt_bytes(size / sampled):>10}/sample  {count / sampled:8.1f} blocks/sample  "
+                  f"grew in {hits}/{sampled} samples  {site}", file=out)
+
+        print("\ngarbage collections:", file=out)
+        if not self.gc_pauses:
+            print("  none", file=out)
+        for gen in (0, 1, 2):
+            pauses = [p for g, p, _ in self.gc_pauses if g == gen]
+            if pauses:
+                print(f"  gen {gen}: {len(pauses)} runs ({len(pauses) / frames:.2f}/frame), "
+                      f"total {sum(pauses) * 1000:.2f} ms, max {max(pauses) * 1000:.3f} ms", file=out)
+
+        rss = peak_rss_bytes()
+        if rss is not None:
+            print(f"\npeak RSS: {_fmt_bytes(rss)}", file=out)
@@ -5,10 +5,26 @@ Load maze/assets background and sprites, run HSV detection to compute
 walls, flag, blue/red starts (selecting blue candidate #2), render a single
 frame (background + sprites + HUD) and save it as maze_run_screenshot.png.
 Print a console summary as requested.
+
+Batch mode: pass one or more level images (or directories of them) and the
+same detection + render runs headless (SDL dummy driver) in a process pool.
+Each level gets a screenshot and a thumbnail in --out-dir, and all results
+are collected in report.json / report.csv there:
+
+    python render_and_report.py levels/*.png --out-dir batch_out --jobs 8
 """
 import pygame, sys, os
 from pathlib import Path
+import argparse
+import collections
 import colorsys
+import concurrent.futures
+import csv
+import json
+import time
+
+import color_profile
+from maze_grid import MazeGrid
 
 # config
 WIDTH, HEIGHT = 800, 480
@@ -21,10 +37,15 @@ SELECT_BLUE_CLUSTER = 2
 # manual start positions to match maze_game.py (user-requested)
 BLUE_START_POS = (55, 48)
 RED_START_POS  = (60, 340)
+# batch mode
+THUMB_WIDTH = 200
+REPORT_FIELDS = ['level', 'ok', 'error', 'blue_start', 'red_start', 'flag_rect',
+                 'wall_pixels', 'screenshot', 'thumbnail', 'seconds']
+
+
+class DetectionError(Exception):
+    """A level image could not be analysed (missing file, no players found...)."""
 
-if not BG.exists():
-    print('Missing background:', BG)
-    sys.exit(1)
 
 # helpers
 
@@ -32,13 +53,14 @@ def rgb_to_hsv(r,g,b):
     h,s,v = colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)
     return h,s,v
 
+# wall / flag thresholds come from the shared profile (calibrate_colors.py)
+PROFILE = color_profile.load_profile()
+
 def is_yellow_hsv(r,g,b):
-    h,s,v = rgb_to_hsv(r,g,b)
-    return (0.10 <= h <= 0.20) and (s > 0.35) and (v > 0.25)
+    return color_profile.is_wall_color((r,g,b), PROFILE)
 
 def is_red_hsv(r,g,b):
-    h,s,v = rgb_to_hsv(r,g,b)
-    return ((h <= 0.06 or h >= 0.94) and s > 0.4 and v > 0.2)
+    return color_profile.is_flag_color((r,g,b), PROFILE)
 
 def is_blue_hsv(r,g,b):
     h,s,v = rgb_to_hsv(r,g,b)
@@ -48,159 +70,133 @@ def is_blue_relaxed(r,g,b):
     h,s,v = rgb_to_hsv(r,g,b)
     return (0.40 <= h <= 0.80) and (s > 0.08) and (v > 0.06)
 
-# load background
-pygame.init()
-# initialize a display so surfaces can be converted; this will open a window briefly
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-bg = pygame.image.load(str(BG)).convert()
-
-# scan
-walls = [[False]*WIDTH for _ in range(HEIGHT)]
-flag_points = []
-blue_points = []
-red_points = []
-
-for y in range(HEIGHT):
-    for x in range(WIDTH):
-        col = bg.get_at((x,y))
-        r,g,b = col.r, col.g, col.b
-        if is_yellow_hsv(r,g,b):
-            walls[y][x] = True
-        if is_red_hsv(r,g,b):
-            flag_points.append((x,y))
-            red_points.append((x,y))
-        if is_blue_hsv(r,g,b):
-            blue_points.append((x,y))
-
-# flag rect
-if flag_points:
-    xs = [p[0] for p in flag_points]; ys = [p[1] for p in flag_points]
-    flag_rect = (min(xs), min(ys), max(xs)-min(xs)+1, max(ys)-min(ys)+1)
-else:
-    flag_rect = None
-
-# bboxes
-
 def bbox_from_points(points):
     if not points: return None
     xs = [p[0] for p in points]; ys = [p[1] for p in points]
     return (min(xs), min(ys), max(xs)-min(xs)+1, max(ys)-min(ys)+1)
 
-blue_bbox = bbox_from_points(blue_points)
-red_bbox = bbox_from_points(red_points)
+def top_clusters(candidates, limit):
+    """group the highest-scoring pixels into up to 6 clusters, return top3 (count, cx, cy)"""
+    candidates.sort(reverse=True,key=lambda c:c[0])
+    clusters = []
+    for score,x,y in candidates[:limit]:
+        placed=False
+        for i,(cnt,sx,sy) in enumerate(clusters):
+            cx = sx//cnt; cy = sy//cnt
+            if abs(x-cx)<=12 and abs(y-cy)<=12:
+                clusters[i] = (cnt+1,sx+x,sy+y); placed=True; break
+        if not placed:
+            clusters.append((1,x,y))
+        if len(clusters)>=6: break
+    clusters.sort(reverse=True,key=lambda c:c[0])
+    top3 = []
+    for i,(cnt,sx,sy) in enumerate(clusters[:3]):
+        cx = sx//cnt; cy = sy//cnt; top3.append((cnt,cx,cy))
+    return top3
 
-# if blue missing, try relaxed components
-import collections
-if blue_bbox is None:
-    relaxed_mask = [[False]*WIDTH for _ in range(HEIGHT)]
-    for y in range(HEIGHT):
-        for x in range(WIDTH):
-            col = bg.get_at((x,y))
-            if is_blue_relaxed(col.r, col.g, col.b):
-                relaxed_mask[y][x] = True
-    seen = [[False]*WIDTH for _ in range(HEIGHT)]
+def relaxed_blue_bbox(bg, width, height):
+    """largest 4-connected component of relaxed-blue pixels, as a 16x16 box"""
+    relaxed_mask = MazeGrid.from_surface(bg, lambda rgb: is_blue_relaxed(*rgb))
+    # pixels still to visit; cleared as the flood fill reaches them
+    todo = relaxed_mask.copy()
     comps = []
-    for y in range(HEIGHT):
-        for x in range(WIDTH):
-            if relaxed_mask[y][x] and not seen[y][x]:
+    for y in range(height):
+        if not todo.row_int(y):
+            continue
+        for x in range(width):
+            if todo.get_at((x,y)):
                 dq = collections.deque()
                 dq.append((x,y))
-                seen[y][x] = True
+                todo.set_at((x,y), 0)
                 size = 0; sx=0; sy=0
                 while dq:
                     cx,cy = dq.popleft()
                     size += 1; sx += cx; sy += cy
                     for nx,ny in ((cx+1,cy),(cx-1,cy),(cx,cy+1),(cx,cy-1)):
-                        if 0<=nx<WIDTH and 0<=ny<HEIGHT and not seen[ny][nx] and relaxed_mask[ny][nx]:
-                            seen[ny][nx] = True; dq.append((nx,ny))
+                        if 0<=nx<width and 0<=ny<height and todo.get_at((nx,ny)):
+                            todo.set_at((nx,ny), 0); dq.append((nx,ny))
                 comps.append((size,sx,sy))
-    if comps:
-        comps.sort(reverse=True, key=lambda c:c[0])
-        size,sx,sy = comps[0]
-        cx = sx//size; cy = sy//size
-        blue_bbox = (max(0,cx-8), max(0,cy-8), 16,16)
-    else:
-        # heuristic clusters
+    if not comps:
+        return None
+    comps.sort(reverse=True, key=lambda c:c[0])
+    size,sx,sy = comps[0]
+    cx = sx//size; cy = sy//size
+    return (max(0,cx-8), max(0,cy-8), 16,16)
+
+def detect(bg):
+    """scan a background surface; returns walls, flag rect and player bboxes"""
+    width, height = bg.get_size()
+    walls = MazeGrid(width, height)
+    flag_points = []
+    blue_points = []
+    red_points = []
+
+    # classify each distinct colour once
+    classes = {}
+    for y in range(height):
+        for x in range(width):
+            col = tuple(bg.get_at((x,y)))[:3]
+            hit = classes.get(col)
+            if hit is None:
+                hit = classes[col] = (is_yellow_hsv(*col), is_red_hsv(*col), is_blue_hsv(*col))
+            wall, red, blue = hit
+            if wall:
+                walls.set_at((x,y))
+            if red:
+                flag_points.append((x,y))
+                red_points.append((x,y))
+            if blue:
+                blue_points.append((x,y))
+
+    flag_rect = bbox_from_points(flag_points)
+    blue_bbox = bbox_from_points(blue_points)
+    red_bbox = bbox_from_points(red_points)
+
+    # if blue missing, try relaxed components, then heuristic clusters
+    if blue_bbox is None:
+        blue_bbox = relaxed_blue_bbox(bg, width, height)
+    if blue_bbox is None:
         candidates = []
-        for y in range(HEIGHT):
-            for x in range(WIDTH):
+        for y in range(height):
+            for x in range(width):
                 col = bg.get_at((x,y))
                 h,s,v = rgb_to_hsv(col.r,col.g,col.b)
                 hue_score = 1.0 - min(abs(h-0.6),1.0)
-                score = hue_score*(s+v)
-                candidates.append((score,x,y))
-        candidates.sort(reverse=True,key=lambda c:c[0])
-        top = candidates[:300]
-        clusters = []
-        for score,x,y in top:
-            placed=False
-            for i,(cnt,sx,sy) in enumerate(clusters):
-                cx = sx//cnt; cy = sy//cnt
-                if abs(x-cx)<=12 and abs(y-cy)<=12:
-                    clusters[i] = (cnt+1,sx+x,sy+y); placed=True; break
-            if not placed:
-                clusters.append((1,x,y))
-            if len(clusters)>=6: break
-        clusters.sort(reverse=True,key=lambda c:c[0])
-        top3 = []
-        for i,(cnt,sx,sy) in enumerate(clusters[:3]):
-            cx = sx//cnt; cy = sy//cnt; top3.append((cnt,cx,cy))
+                candidates.append((hue_score*(s+v),x,y))
+        top3 = top_clusters(candidates, 300)
         if len(top3)>=SELECT_BLUE_CLUSTER:
             _,cx,cy = top3[SELECT_BLUE_CLUSTER-1]
             blue_bbox = (max(0,cx-8), max(0,cy-8),16,16)
         else:
-            print('Blue detection failed; top3 candidates:', top3)
-            sys.exit(1)
-
-# red bbox presence check
-if red_bbox is None:
-    # compute top3 red clusters
-    candidates=[]
-    for y in range(HEIGHT):
-        for x in range(WIDTH):
-            col = bg.get_at((x,y))
-            h,s,v = rgb_to_hsv(col.r,col.g,col.b)
-            hue_dist = min(abs(h-0.0), abs(h-1.0))
-            score = (1.0-hue_dist)*(s+v)
-            candidates.append((score,x,y))
-    candidates.sort(reverse=True,key=lambda c:c[0])
-    top = candidates[:400]
-    clusters=[]
-    for score,x,y in top:
-        placed=False
-        for i,(cnt,sx,sy) in enumerate(clusters):
-            cx = sx//cnt; cy = sy//cnt
-            if abs(x-cx)<=12 and abs(y-cy)<=12:
-                clusters[i]=(cnt+1,sx+x,sy+y); placed=True; break
-        if not placed:
-            clusters.append((1,x,y))
-        if len(clusters)>=6: break
-    clusters.sort(reverse=True,key=lambda c:c[0])
-    top3=[]
-    for i,(cnt,sx,sy) in enumerate(clusters[:3]):
-        cx=sx//cnt; cy=sy//cnt; top3.append((cnt,cx,cy))
-    print('Red detection failed; top3 candidates:', top3)
-    sys.exit(1)
-
-# compute centers and sprite top-lefts
-def center_from_bbox_tuple(b):
-    x,y,w,h = b
-    return (x + w//2, y + h//2)
-
-# Use manual start positions instead of detected centers
-bx, by = BLUE_START_POS
-rx, ry = RED_START_POS
-
-# clamp just in case
-bx = max(0, min(bx, WIDTH-32)); by = max(0, min(by, HEIGHT-32))
-rx = max(0, min(rx, WIDTH-32)); ry = max(0, min(ry, HEIGHT-32))
-
-# load sprites, fail if missing
-if not BLUE.exists() or not RED.exists():
-    print('Missing sprites in', ASSETS)
-    for fn in sorted(os.listdir(ASSETS)):
-        p=ASSETS/fn; print(fn, p.stat().st_size)
-    sys.exit(1)
+            raise DetectionError(f'Blue detection failed; top3 candidates: {top3}')
+
+    # red bbox presence check
+    if red_bbox is None:
+        candidates=[]
+        for y in range(height):
+            for x in range(width):
+                col = bg.get_at((x,y))
+                h,s,v = rgb_to_hsv(col.r,col.g,col.b)
+                hue_dist = min(abs(h-0.0), abs(h-1.0))
+                candidates.append(((1.0-hue_dist)*(s+v),x,y))
+        raise DetectionError(f'Red detection failed; top3 candidates: {top_clusters(candidates, 400)}')
+
+    return {'walls': walls, 'flag_rect': flag_rect, 'blue_bbox': blue_bbox, 'red_bbox': red_bbox}
+
+def start_positions(width=WIDTH, height=HEIGHT):
+    # Use manual start positions instead of detected centers
+    bx, by = BLUE_START_POS
+    rx, ry = RED_START_POS
+    # clamp just in case
+    bx = max(0, min(bx, width-32)); by = max(0, min(by, height-32))
+    rx = max(0, min(rx, width-32)); ry = max(0, min(ry, height-32))
+    return (bx, by), (rx, ry)
+
+def check_sprites():
+    # load sprites, fail if missing
+    if not BLUE.exists() or not RED.exists():
+        listing = ', '.join(f'{fn} {(ASSETS/fn).stat().st_size}' for fn in sorted(os.listdir(ASSETS)))
+        raise DetectionError(f'Missing sprites in {ASSETS}: {listing}')
 
 # load and center into 32x32 with target 28
 def load_centered_sprite(path):
@@ -214,35 +210,169 @@ def load_centered_sprite(path):
     canvas.blit(small, ((32-nw)//2, (32-nh)//2))
     return canvas
 
-blue_sprite = load_centered_sprite(BLUE)
-red_sprite = load_centered_sprite(RED)
-
-# Render one frame
-surf = pygame.Surface((WIDTH,HEIGHT))
-surf.blit(bg, (0,0))
-surf.blit(blue_sprite, (bx,by))
-surf.blit(red_sprite, (rx,ry))
-
-# draw HUD timer at 3:00
-font = pygame.font.SysFont(None,22); bigfont = pygame.font.SysFont(None,36)
-hud_w,hud_h = 220,34
-hud = pygame.Surface((hud_w,hud_h), pygame.SRCALPHA); hud.fill((20,20,20,160))
-txt = bigfont.render('3:00', True, (255,220,60)); hud.blit(txt, (hud_w//2-txt.get_width()//2, hud_h//2-txt.get_height()//2))
-surf.blit(hud, (WIDTH//2 - hud_w//2, 6))
-
-# save screenshot
-pygame.image.save(surf, SCREENSHOT)
-
-# count wall pixels
-wall_count = sum(1 for y in range(HEIGHT) for x in range(WIDTH) if walls[y][x])
-
-# print summary
-print('Using background:', str(BG))
-print('Blue start:', (bx,by))
-print('Red start:', (rx,ry))
-print('Flag rect:', flag_rect)
-print('Wall pixels detected:', wall_count)
-print('Saved screenshot to', SCREENSHOT)
-
-pygame.quit()
-sys.exit(0)
+def render_frame(bg, blue_sprite, red_sprite, blue_pos, red_pos):
+    width, height = bg.get_size()
+    surf = pygame.Surface((width,height))
+    surf.blit(bg, (0,0))
+    surf.blit(blue_sprite, blue_pos)
+    surf.blit(red_sprite, red_pos)
+
+    # draw HUD timer at 3:00
+    bigfont = pygame.font.SysFont(None,36)
+    hud_w,hud_h = 220,34
+    hud = pygame.Surface((hud_w,hud_h), pygame.SRCALPHA); hud.fill((20,20,20,160))
+    txt = bigfont.render('3:00', True, (255,220,60)); hud.blit(txt, (hud_w//2-txt.get_width()//2, hud_h//2-txt.get_height()//2))
+    surf.blit(hud, (width//2 - hud_w//2, 6))
+    return surf
+
+# ---------- batch mode ----------
+
+_worker_sprites = None
+
+def init_headless():
+    """pygame with the SDL dummy driver: no window, but convert() still works"""
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+
+def _init_worker():
+    global _worker_sprites
+    init_headless()
+    check_sprites()
+    _worker_sprites = (load_centered_sprite(BLUE), load_centered_sprite(RED))
+
+def report_level(level_path, name, out_dir, thumb_width):
+    """worker: detect + render one level, write its screenshot/thumbnail, return a report row"""
+    t0 = time.perf_counter()
+    row = {'level': str(level_path), 'ok': False, 'error': ''}
+    try:
+        try:
+            bg = pygame.image.load(str(level_path)).convert()
+        except (pygame.error, FileNotFoundError) as e:
+            raise DetectionError(f'cannot load {level_path}: {e}')
+        found = detect(bg)
+        blue_pos, red_pos = start_positions(*bg.get_size())
+        frame = render_frame(bg, *_worker_sprites, blue_pos, red_pos)
+
+        shot = Path(out_dir) / f'{name}.png'
+        pygame.image.save(frame, str(shot))
+        w, h = frame.get_size()
+        thumb = pygame.transform.smoothscale(frame, (thumb_width, max(1, h * thumb_width // w)))
+        thumb_path = Path(out_dir) / 'thumbs' / f'{name}.png'
+        pygame.image.save(thumb, str(thumb_path))
+
+        row.update(ok=True, blue_start=blue_pos, red_start=red_pos, flag_rect=found['flag_rect'],
+                   wall_pixels=found['walls'].count(),
+                   screenshot=str(shot), thumbnail=str(thumb_path))
+    except DetectionError as e:
+        row['error'] = str(e)
+    except Exception as e:
+        # 任何一关出意外都只记在它自己那一行，别让 pool.map 中途抛出、整份报告写不出来
+        row['error'] = f'{type(e).__name__}: {e}'
+    row['seconds'] = round(time.perf_counter() - t0, 3)
+    return row
+
+def collect_levels(paths):
+    levels = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            levels.extend(sorted(p.glob('*.png')))
+        else:
+            levels.append(p)
+    return levels
+
+def write_report(rows, out_dir):
+    out_dir = Path(out_dir)
+    (out_dir / 'report.json').write_text(json.dumps(rows, indent=2), encoding='utf-8')
+    with open(out_dir / 'report.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+def run_batch(paths, out_dir, jobs=None, thumb_width=THUMB_WIDTH):
+    try:
+        check_sprites()
+    except DetectionError as e:
+        print(e)
+        return 1
+    levels = collect_levels(paths)
+    out_dir = Path(out_dir)
+    (out_dir / 'thumbs').mkdir(parents=True, exist_ok=True)
+
+    # unique output names even when two folders contain the same file name
+    names, used = [], collections.Counter()
+    for p in levels:
+        used[p.stem] += 1
+        names.append(p.stem if used[p.stem] == 1 else f'{p.stem}_{used[p.stem]}')
+
+    t0 = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+        rows = list(pool.map(report_level, levels, names,
+                             [out_dir]*len(levels), [thumb_width]*len(levels)))
+    write_report(rows, out_dir)
+
+    failed = [r for r in rows if not r['ok']]
+    print(f'Processed {len(rows)} level(s) in {time.perf_counter()-t0:.1f}s, {len(failed)} failed')
+    for r in failed:
+        print('  FAIL', r['level'], '-', r['error'])
+    print('Report written to', out_dir / 'report.json', 'and', out_dir / 'report.csv')
+    return 1 if failed else 0
+
+# ---------- single level (original behaviour) ----------
+
+def run_single():
+    if not BG.exists():
+        print('Missing background:', BG)
+        return 1
+
+    # load background
+    pygame.init()
+    # initialize a display so surfaces can be converted; this will open a window briefly
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    bg = pygame.image.load(str(BG)).convert()
+
+    try:
+        found = detect(bg)
+        check_sprites()
+    except DetectionError as e:
+        print(e)
+        return 1
+    (bx, by), (rx, ry) = start_positions()
+
+    blue_sprite = load_centered_sprite(BLUE)
+    red_sprite = load_centered_sprite(RED)
+
+    # Render one frame and save screenshot
+    surf = render_frame(bg, blue_sprite, red_sprite, (bx,by), (rx,ry))
+    pygame.image.save(surf, SCREENSHOT)
+
+    # count wall pixels
+    wall_count = found['walls'].count()
+
+    # print summary
+    print('Using background:', str(BG))
+    print('Blue start:', (bx,by))
+    print('Red start:', (rx,ry))
+    print('Flag rect:', found['flag_rect'])
+    print('Wall pixels detected:', wall_count)
+    print('Saved screenshot to', SCREENSHOT)
+    return 0
+
+def main():
+    ap = argparse.ArgumentParser(description='Detect + render maze levels and report.')
+    ap.add_argument('levels', nargs='*', help='level images or directories (batch mode, headless)')
+    ap.add_argument('--out-dir', default='batch_report')
+    ap.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    ap.add_argument('--thumb-width', type=int, default=THUMB_WIDTH)
+    args = ap.parse_args()
+
+    try:
+        if args.levels:
+            return run_batch(args.levels, args.out_dir, args.jobs, args.thumb_width)
+        return run_single()
+    finally:
+        pygame.quit()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+tile_collision.py
+Tile-grid collision: walls are whole tiles, so a player rect only has to
+look at the few tiles it overlaps instead of every pixel under it.
+
+The grid comes either from an ASCII level (maze/level_maze.txt, 25x15
+tiles of 32px) or is derived from the collision mask pixel mode uses (the
+hay_wall.png threshold mask) at a finer tile size: a tile is a wall as soon
+as it holds a single wall pixel, so thin walls never disappear (players
+only lose the sub-tile slack next to a wall).  Tiles are kept in a
+flat bytes array, one byte per tile, so blocked() is a handful of direct
+index lookups.  TileMap.move() resolves one axis at a time and slides
+players round corners when they are within SLIDE_MAX px of a free lane.
+
+Run this file to compare tile mode against pixel mode on the current level:
+
+    python tile_collision.py --tile 8 --samples 20000
+"""
+import argparse
+import random
+import sys
+import time
+
+from maze_grid import MazeGrid
+
+# 离空着的通道还差多少像素以内就帮玩家“滑”过去（按格子大小的比例）
+SLIDE_MAX = 0.5
+
+
+class TileMap:
+    """cols x rows 的墙格子；tile 是每格的像素边长"""
+
+    def __init__(self, grid, tile, slide=True, walls=None):
+        self.grid = grid
+        self.tile = tile
+        self.slide = slide
+        self.cols, self.rows = grid.get_size()
+        self.width, self.height = self.cols * tile, self.rows * tile
+        # 一格一个字节，按行排；blocked() 直接按下标查
+        if walls is None:
+            walls = bytes(grid.get_at((c, r)) for r in range(self.rows) for c in range(self.cols))
+        self.walls = walls
+
+    @classmethod
+    def from_ascii(cls, path, width, slide=True):
+        grid = MazeGrid.load_ascii(path)
+        return cls(grid, width // grid.width, slide)
+
+    @classmethod
+    def from_pixels(cls, wall_grid, tile, coverage=0.0, slide=True):
+        """从像素碰撞 MazeGrid 降采样；格子里墙占比 >= coverage 就算墙
+
+        碰撞遮罩里的墙可能只有一两像素宽，所以默认 coverage=0：格子里有一个墙像素就算墙。
+        """
+        w, h = wall_grid.get_size()
+        cols, rows = w // tile, h // tile
+        grid = MazeGrid(cols, rows)
+        need = max(1, coverage * tile * tile)
+        for r in range(rows):
+            for c in range(cols):
+                if wall_grid.count_in_rect((c * tile, r * tile, tile, tile)) >= need:
+                    grid.set_at((c, r))
+        return cls(grid, tile, slide)
+
+    def tile_span(self, rect):
+        """像素 rect (x, y, w, h) 压到的格子范围 (c0, r0, c1, r1)，右下不含，已裁到地图内"""
+        x, y, w, h = rect
+        t = self.tile
+        return (max(0, x // t), max(0, y // t),
+                min(self.cols, -(-(x + w) // t)), min(self.rows, -(-(y + h) // t)))
+
+    def snap(self, rect):
+        """把像素 rect 扩到格子边界；格子模式下碰撞结果改变的范围"""
+        c0, r0, c1, r1 = self.tile_span(rect)
+        t = self.tile
+        return (c0 * t, r0 * t, max(0, c1 - c0) * t, max(0, r1 - r0) * t)
+
+    def updated(self, wall_grid, rects, coverage=0.0):
+        """wall_grid 只有 rects 里变了：返回只重算了这些格子的新 TileMap（自己不动，游戏线程可能还在用）"""
+        t = self.tile
+        need = max(1, coverage * t * t)
+        grid = self.grid.copy()
+        walls = bytearray(self.walls)
+        for rect in rects:
+            c0, r0, c1, r1 = self.tile_span(rect)
+            for r in range(r0, r1):
+                for c in range(c0, c1):
+                    wall = wall_grid.count_in_rect((c * t, r * t, t, t)) >= need
+                    grid.set_at((c, r), wall)
+                    walls[r * self.cols + c] = wall
+        return TileMap(grid, t, self.slide, bytes(walls))
+
+    def blocked(self, x, y, size):
+        """size x size 的玩家放在 (x, y) 会不会压到墙格（出了地图也算墙）"""
+        x, y = int(x), int(y)
+        if x < 0 or y < 0 or x + size > self.width or y + size > self.height:
+            return True
+        t = self.tile
+        tx0, tx1 = x // t, (x + size - 1) // t + 1
+        walls, cols = self.walls, self.cols
+        for base in range(y // t * cols, (y + size - 1) // t * cols + 1, cols):
+            if walls.find(1, base + tx0, base + tx1) >= 0:
+                return True
+        return False
+
+    def _slide(self, along, across, step, size, horizontal):
+        """沿 along 方向被挡住时，看看把 across 对齐到相邻格子边界能不能过去"""
+        t = self.tile
+        a = int(across)
+        candidates = (a // t * t, -(-(a + size) // t) * t - size)
+        for cand in sorted(candidates, key=lambda c: abs(c - across)):
+            dist = cand - across
+            if not dist or abs(dist) > t * SLIDE_MAX:
+                continue
+            if horizontal:
+                free = not self.blocked(along, cand, size) and not self.blocked(along - step, cand, size)
+            else:
+                free = not self.blocked(cand, along, size) and not self.blocked(cand, along - step, size)
+            if free:
+                nudge = min(abs(step), abs(dist))
+                return across + (nudge if dist > 0 else -nudge)
+        return across
+
+    def move(self, x, y, dx, dy, size):
+        """先 x 后 y，各自撞墙就不动；开了 slide 会顺着拐角挪一点"""
+        if dx:
+            if not self.blocked(x + dx, y, size):
+                x += dx
+            elif self.slide:
+                y = self._slide(x + dx, y, dx, size, horizontal=True)
+        if dy:
+            if not self.blocked(x, y + dy, size):
+                y += dy
+            elif self.slide:
+                x = self._slide(y + dy, x, dy, size, horizontal=False)
+        return x, y
+
+
+def compare(wall_grid, tiles, size, samples, seed=0):
+    """随机摆放玩家，比较像素模式和格子模式的判定结果和耗时；wall_grid 要跟游戏像素模式用的是同一张"""
+    rng = random.Random(seed)
+    w, h = wall_grid.get_size()
+    spots = [(rng.randrange(0, w - size), rng.randrange(0, h - size)) for _ in range(samples)]
+
+    t0 = time.perf_counter()
+    pixel = [wall_grid.any_in_rect((x, y, size, size)) for x, y in spots]
+    t_pixel = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    tile = [tiles.blocked(x, y, size) for x, y in spots]
+    t_tile = time.perf_counter() - t0
+
+    both = sum(1 for p, q in zip(pixel, tile) if p and q)
+    only_pixel = sum(1 for p, q in zip(pixel, tile) if p and not q)
+    only_tile = sum(1 for p, q in zip(pixel, tile) if q and not p)
+    return {
+        "samples": samples,
+        "agree": samples - only_pixel - only_tile,
+        "both_blocked": both,
+        "pixel_only": only_pixel,
+        "tile_only": only_tile,
+        "pixel_us": t_pixel / samples * 1e6,
+        "tile_us": t_tile / samples * 1e6,
+    }
+
+
+def main():
+    import os
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    import maze_game
+
+    ap = argparse.ArgumentParser(description="Compare tile-grid collision against pixel collision.")
+    ap.add_argument("--hay", default=maze_game.HAY_WALL_PATH, help="collision image (pixel mode's mask)")
+    ap.add_argument("--ascii", default=None, help="ASCII level to use instead of deriving tiles")
+    ap.add_argument("--tile", type=int, default=maze_game.TILE_FINE)
+    ap.add_argument("--size", type=int, default=maze_game.PLAYER_SIZE)
+    ap.add_argument("--samples", type=int, default=20000)
+    args = ap.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    hay_img = pygame.image.load(args.hay).convert()
+    wall_grid = MazeGrid.from_mask(pygame.mask.from_threshold(hay_img, maze_game.HAY_RGB, maze_game.HAY_TOL))
+    if args.ascii:
+        tiles = TileMap.from_ascii(args.ascii, wall_grid.width)
+    else:
+        tiles = TileMap.from_pixels(wall_grid, args.tile)
+    pygame.quit()
+
+    r = compare(wall_grid, tiles, args.size, args.samples)
+    print(f"[info] tiles: {tiles.cols}x{tiles.rows} of {tiles.tile}px, player {args.size}px")
+    print(f"[ok] agreement: {r['agree']}/{r['samples']} ({r['agree'] / r['samples']:.1%})")
+    print(f"     blocked in both: {r['both_blocked']}, pixel only: {r['pixel_only']}, tile only: {r['tile_only']}")
+    print(f"[ok] per query: pixel {r['pixel_us']:.1f} us, tile {r['tile_us']:.1f} us")
+
+
+if __name__ == "__main__":
+    sys.exit(main())